@@ -0,0 +1,127 @@
+"""
+Press-to-sound latency benchmark of pi3ctrl-core.
+
+Runs `pi3ctrl.core` against gpiozero mock pins, a dummy player and a temporary
+SQLite database, drives press storms and reports the latency from the press to
+the player start, presses handled per second, dropped presses and threads.
+
+    python benchmarks/bench_core.py --policy queue --presses 1000 --rate 50
+"""
+# Absolute imports
+from argparse import ArgumentParser
+from time import perf_counter, sleep
+import os
+import random
+import threading
+import wave
+
+# Relative imports
+from common import format_ms, temporary_config
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--policy', default='drop', help='PRESS_POLICY (default: drop)')
+    parser.add_argument('--presses', type=int, default=500, help='number of presses per storm (default: 500)')
+    parser.add_argument('--rate', type=float, default=20., help='presses per second, 0 for flat out (default: 20)')
+    parser.add_argument('--duration', type=float, default=.05, help='dummy sound duration in seconds (default: .05)')
+    parser.add_argument('--queue-size', type=int, default=4, help='PRESS_QUEUE_SIZE (default: 4)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Configure before pi3ctrl.core reads the config and creates its pins
+    os.environ['GPIOZERO_PIN_FACTORY'] = 'mock'
+    folder = temporary_config(
+        PRESS_POLICY=args.policy,
+        PRESS_QUEUE_SIZE=args.queue_size,
+        BUTTON_DEBOUNCE_SECONDS=0.,
+        SOUNDFILE_PLAYER='/bin/true',
+    )
+
+    # Silent soundFiles for every button, the catalog skips buttons without one
+    from pi3ctrl.config import get_config
+    from pi3ctrl.soundfiles import soundFile
+    for i, pin in enumerate(get_config()['BUTTON_PINS']):
+        with wave.open(os.path.join(folder, 'soundFiles', soundFile(i, pin)), 'wb') as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(8000)
+            w.writeframes(bytes(2 * int(8000 * args.duration)))
+
+    from pi3ctrl import core, initialize
+    from pi3ctrl.player import Player
+
+    core._logger.setLevel('WARNING')
+
+    latencies = []
+
+    class DummyPlayer(Player):
+        """Player recording its start latency and sleeping for the sound duration."""
+        pressed = None
+
+        def play(self, path: str) -> bool:
+            latencies.append(perf_counter() - self.pressed)
+            self._stop_event.wait(args.duration)
+            return True
+
+    play_button = core.play_button
+
+    def timed_play_button(button, player, pressed=None):
+        player.pressed = pressed
+        return play_button(button, player, pressed)
+
+    core.play_button = timed_play_button
+    for voice in core._voices:
+        voice.player = DummyPlayer(core._config)
+
+    outcomes = []
+    put = core._writer.put
+
+    def counted_put(**kwargs):
+        outcomes.append(kwargs['outcome'])
+        return put(**kwargs)
+
+    core._writer.put = counted_put
+
+    # Start the core daemon threads
+    initialize(core._app)
+    core._writer.start()
+    core._scheduler.start()
+    for voice in core._voices:
+        voice.start()
+    core.enable_buttons()
+    core.set_leds_standby()
+
+    # Press storm
+    random.seed(args.seed)
+    threads = threading.active_count()
+    interval = 1. / args.rate if args.rate > 0 else 0.
+    start = perf_counter()
+    for i in range(args.presses):
+        button = random.choice(core._buttons)
+        button.pin.drive_low()
+        button.pin.drive_high()
+        threads = max(threads, threading.active_count())
+        if interval:
+            sleep(max(0., start + (i + 1) * interval - perf_counter()))
+    while any(voice.busy for voice in core._voices):
+        sleep(.001)
+    elapsed = perf_counter() - start
+
+    # Flush triggers and stop
+    for voice in core._voices:
+        voice.stop()
+    core._writer.stop()
+    core._scheduler.stop()
+
+    handled = len(latencies)
+    dropped = outcomes.count('dropped')
+    print(f"policy={args.policy} presses={args.presses} rate={args.rate}/s duration={args.duration}s")
+    print(f"  press-to-start latency: {format_ms(latencies)}")
+    print(f"  handled: {handled} ({handled / elapsed:.1f}/s), dropped: {dropped}, "
+          f"outcomes: { {o: outcomes.count(o) for o in sorted(set(outcomes))} }")
+    print(f"  threads: {threads} max")
+
+
+if __name__ == '__main__':
+    main()
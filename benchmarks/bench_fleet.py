@@ -0,0 +1,114 @@
+"""
+Fleet aggregator polling rounds against local stand-in units.
+
+Serves a number of pi3ctrl apps, each with its own temporary SQLite database
+filled with triggers, on local ports, plus one unit that responds slower than
+the read timeout and one that is down. Reports the backfill round, a delta
+round after new triggers and whether the merged store is complete.
+
+    python benchmarks/bench_fleet.py --units 8 --triggers 5000 --delta 100
+"""
+# Absolute imports
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from threading import Thread
+from time import perf_counter, sleep
+import logging
+import os
+import socket
+import tempfile
+
+# Relative imports
+from common import temporary_config
+
+
+def stand_in(folder: str, name: str, triggers: int, delay: float = 0.):
+    """Serve a pi3ctrl app with `triggers` triggers on a local port, delaying
+    every response by `delay` seconds. Returns the app and its url.
+    """
+    from werkzeug.serving import make_server
+    from pi3ctrl import create_app, initialize
+
+    unit = os.path.join(folder, name)
+    os.makedirs(os.path.join(unit, 'soundFiles'))
+    app = create_app(test_config=dict(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(unit, 'pi3ctrl.sqlite3')}",
+        SOUNDFILE_FOLDER=os.path.join(unit, 'soundFiles'),
+        CORE_SOCKET=os.path.join(unit, 'pi3ctrl-core.sock'),
+        AUTOHOTSPOT_ENV_FILE=os.path.join(unit, 'pi3ctrl-autohotspot.env'),
+    ))
+    initialize(app)
+    add_triggers(app, triggers)
+
+    def slow(environ, start_response):
+        sleep(delay)
+        return app(environ, start_response)
+
+    server = make_server('127.0.0.1', 0, slow if delay else app, threaded=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return app, f"http://127.0.0.1:{server.server_port}"
+
+
+def add_triggers(app, n: int):
+    from pi3ctrl.database import db, Trigger
+
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add_all([Trigger(button=i % 3, pin=17, created=now - timedelta(seconds=i)) for i in range(n)])
+        db.session.commit()
+
+
+def closed_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def timed_round(poller, label: str):
+    t0 = perf_counter()
+    results = poller.poll_all()
+    elapsed = perf_counter() - t0
+    fetched = sum(n for n in results.values() if n and n > 0)
+    failed = sorted(name for name, n in results.items() if n == -1)
+    print(f"{label}: {elapsed:.2f}s fetched={fetched} triggers={fetched / elapsed:.0f}/s failed={failed}")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--units', type=int, default=8, help='healthy stand-in units (default: 8)')
+    parser.add_argument('--triggers', type=int, default=5000, help='triggers per unit (default: 5000)')
+    parser.add_argument('--delta', type=int, default=100, help='new triggers per unit in the delta round (default: 100)')
+    parser.add_argument('--timeout', type=float, default=2., help='read timeout in seconds (default: 2)')
+    parser.add_argument('--workers', type=int, default=8, help='poller threads (default: 8)')
+    args = parser.parse_args()
+
+    temporary_config()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    from pi3ctrl.fleet import FleetPoller
+
+    folder = tempfile.mkdtemp(prefix='pi3ctrl-fleet-')
+    apps, units = dict(), dict()
+    for i in range(args.units):
+        apps[f"unit{i}"], units[f"unit{i}"] = stand_in(folder, f"unit{i}", args.triggers)
+    _, units['slow'] = stand_in(folder, 'slow', args.triggers, delay=2 * args.timeout)
+    units['down'] = f"http://127.0.0.1:{closed_port()}"
+
+    poller = FleetPoller(units, f"sqlite:///{os.path.join(folder, 'fleet.sqlite3')}",
+                         timeout=(1., args.timeout), workers=args.workers,
+                         pragmas={'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000})
+    print(f"units={args.units}+slow+down triggers={args.triggers} timeout={args.timeout}s workers={args.workers}")
+    try:
+        timed_round(poller, 'backfill')
+        for app in apps.values():
+            add_triggers(app, args.delta)
+        timed_round(poller, 'delta')
+        summary = poller.summary()
+        expected = args.triggers + args.delta
+        complete = all(summary[name]['triggers'] == expected for name in apps)
+        print(f"merged store complete: {complete}")
+    finally:
+        poller.close()
+
+
+if __name__ == '__main__':
+    main()
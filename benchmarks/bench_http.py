@@ -0,0 +1,93 @@
+"""
+HTTP benchmark of the pi3ctrl Flask app.
+
+Seeds a temporary SQLite database with trigger tables of increasing size and
+times `/_metrics`, `/_triggers` and `/_tab/<tab>` with the Flask test client.
+
+    python benchmarks/bench_http.py --rows 10000 100000 1000000
+"""
+# Absolute imports
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from time import perf_counter
+import random
+
+# Relative imports
+from common import format_ms, temporary_config
+
+
+endpoints = (
+    '/_metrics',
+    '/_triggers',
+    '/_triggers?format=ndjson&since={since}',
+    '/_tab/home',
+    '/_tab/ctrl',
+    '/_tab/data',
+    '/_tab/status',
+)
+
+
+def seed(app, rows: int, chunk: int = 50000):
+    """Insert random triggers spread over the last year, then rebuild the rollups."""
+    from sqlalchemy import insert
+    from pi3ctrl.database import db, Trigger, rebuild_trigger_counts
+
+    pins = app.config['BUTTON_PINS']
+    end = datetime(2024, 1, 1)
+    with app.app_context():
+        for offset in range(0, rows, chunk):
+            values = []
+            for _ in range(min(chunk, rows - offset)):
+                button = random.randrange(len(pins))
+                values.append(dict(
+                    button=button,
+                    pin=pins[button],
+                    created=end - timedelta(seconds=random.randrange(365 * 86400)),
+                    outcome='played',
+                ))
+            values.sort(key=lambda v: v['created'])
+            db.session.execute(insert(Trigger.__table__), values)
+            db.session.commit()
+        rebuild_trigger_counts()
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='trigger table sizes (default: 10000 100000 1000000)')
+    parser.add_argument('--repeat', type=int, default=20, help='requests per endpoint (default: 20)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    since = '2023-12-31'
+
+    for rows in args.rows:
+        temporary_config()
+
+        from pi3ctrl import create_app, initialize
+        app = create_app()
+        initialize(app)
+
+        start = perf_counter()
+        seed(app, rows)
+        print(f"rows={rows} (seeded in {perf_counter() - start:.1f}s)")
+
+        client = app.test_client()
+        headers = {'Referer': 'http://127.0.0.1/'}
+        for endpoint in endpoints:
+            url = endpoint.format(since=since)
+            timings = []
+            size = 0
+            for _ in range(args.repeat):
+                start = perf_counter()
+                resp = client.get(url, headers=headers)
+                size = len(resp.get_data())
+                timings.append(perf_counter() - start)
+                if resp.status_code != 200:
+                    raise RuntimeError(f"{url} returned {resp.status_code}")
+            print(f"  {url:<45} {format_ms(timings)} size={size}B")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Recent trigger reads from the shared memory ring versus the database.
+
+Fills a temporary SQLite database with triggers and publishes the most recent
+ones to a trigger ring, as pi3ctrl-core does, then times `/_recent` served
+from the ring and from the database while a writer keeps publishing presses.
+
+    python benchmarks/bench_ring.py --rows 100000 --limit 100 --requests 500
+"""
+# Absolute imports
+from argparse import ArgumentParser
+from datetime import timedelta
+from threading import Event, Thread
+from time import perf_counter, sleep
+import os
+
+# Relative imports
+from common import format_ms, temporary_config, temporary_settings
+
+
+def timed(client, url: str, n: int) -> tuple:
+    times, source = [], None
+    for _ in range(n):
+        t0 = perf_counter()
+        resp = client.get(url)
+        times.append(perf_counter() - t0)
+        source = resp.get_json()['source']
+    return times, source
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='triggers in the database (default: 100000)')
+    parser.add_argument('--limit', type=int, default=100, help='recent triggers per request (default: 100)')
+    parser.add_argument('--requests', type=int, default=500, help='requests per source (default: 500)')
+    parser.add_argument('--rate', type=float, default=20., help='presses per second published (default: 20)')
+    args = parser.parse_args()
+
+    folder = temporary_config()
+    ring_path = os.path.join(folder, 'pi3ctrl-triggers')
+    from pi3ctrl import create_app, initialize
+    from pi3ctrl.database import db, Trigger, utcnow
+    from pi3ctrl.ring import TriggerRing
+
+    ring = TriggerRing(ring_path, slots=4096)
+    with_ring = create_app(test_config=dict(temporary_settings(folder), RING_PATH=ring_path))
+    without_ring = create_app(test_config=dict(temporary_settings(folder), RING_PATH=None))
+    initialize(with_ring)
+
+    now = utcnow()
+    with with_ring.app_context():
+        triggers = [dict(button=i % 3, pin=17, created=now - timedelta(seconds=i)) for i in range(args.rows, 0, -1)]
+        db.session.execute(db.insert(Trigger), triggers)
+        db.session.commit()
+    for trigger in triggers[-ring.slots:]:
+        ring.append(trigger['button'], trigger['pin'], 'played', trigger['created'])
+
+    # Keep publishing presses like the core
+    stop = Event()
+
+    def publish():
+        while not stop.is_set():
+            ring.append(0, 17, 'played', utcnow())
+            sleep(1 / args.rate)
+
+    writer = Thread(target=publish, daemon=True)
+    writer.start()
+
+    print(f"rows={args.rows} limit={args.limit} requests={args.requests} rate={args.rate}/s")
+    try:
+        url = f"/_recent?limit={args.limit}"
+        for label, app in (('ring', with_ring), ('database', without_ring)):
+            times, source = timed(app.test_client(), url, args.requests)
+            print(f"{label:>8}: {format_ms(times)} source={source}")
+    finally:
+        stop.set()
+        writer.join()
+        ring.close()
+
+
+if __name__ == '__main__':
+    main()
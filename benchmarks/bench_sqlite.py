@@ -0,0 +1,116 @@
+"""
+Concurrent SQLite write throughput of the database engine profiles.
+
+Runs writer processes committing single triggers, like pi3ctrl-core and the
+uwsgi workers serving /_trigger, next to reader processes computing the
+/_metrics rollup, against a temporary SQLite database. The default rollback
+journal without retries is compared to the shipped WAL profile.
+
+    python benchmarks/bench_sqlite.py --writers 3 --readers 2 --duration 10
+"""
+# Absolute imports
+from argparse import ArgumentParser
+from time import perf_counter
+import multiprocessing
+import os
+
+# Relative imports
+from common import format_ms, temporary_config
+
+
+# Engine profiles, on top of the shipped config
+profiles = {
+    'default': dict(SQLITE_PRAGMAS={'journal_mode': 'DELETE'}, SQLITE_POOL={}, TRIGGER_RETRIES=0),
+    'wal': dict(),
+}
+
+
+def writer(index: int, start, duration: float, results):
+    from sqlalchemy.exc import OperationalError
+    from pi3ctrl import create_app
+    from pi3ctrl.database import Trigger, write_with_retry
+
+    app = create_app(process='core' if index == 0 else 'http')
+    latencies, errors = [], 0
+    with app.app_context():
+        start.wait()
+        deadline = perf_counter() + duration
+        while perf_counter() < deadline:
+            t0 = perf_counter()
+            try:
+                write_with_retry(
+                    lambda session: session.add(Trigger(button=index % 3, pin=17)),
+                    retries=app.config['TRIGGER_RETRIES'],
+                    backoff=app.config['TRIGGER_RETRY_BACKOFF'],
+                )
+                latencies.append(perf_counter() - t0)
+            except OperationalError:
+                errors += 1
+    results.put(('write', latencies, errors))
+
+
+def reader(start, duration: float, results):
+    from sqlalchemy.exc import OperationalError
+    from pi3ctrl import create_app
+    from pi3ctrl.database import db, trigger_metrics
+
+    app = create_app()
+    latencies, errors = [], 0
+    with app.app_context():
+        start.wait()
+        deadline = perf_counter() + duration
+        while perf_counter() < deadline:
+            t0 = perf_counter()
+            try:
+                trigger_metrics()
+                latencies.append(perf_counter() - t0)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+    results.put(('read', latencies, errors))
+
+
+def run(profile: str, args) -> None:
+    temporary_config(**profiles[profile])
+
+    from pi3ctrl import create_app, initialize
+    initialize(create_app())
+
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=writer, args=(i, start, args.duration, results))
+                 for i in range(args.writers)]
+    processes += [multiprocessing.Process(target=reader, args=(start, args.duration, results))
+                  for _ in range(args.readers)]
+    for p in processes:
+        p.start()
+    start.set()
+
+    collected = dict(write=([], 0), read=([], 0))
+    for _ in processes:
+        kind, latencies, errors = results.get()
+        collected[kind] = (collected[kind][0] + latencies, collected[kind][1] + errors)
+    for p in processes:
+        p.join()
+
+    print(f"profile={profile} writers={args.writers} readers={args.readers} duration={args.duration}s")
+    for kind, (latencies, errors) in collected.items():
+        print(f"  {kind}s: {len(latencies) / args.duration:.1f}/s errors={errors} {format_ms(latencies)}")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=3, help='writer processes (default: 3)')
+    parser.add_argument('--readers', type=int, default=2, help='metrics reader processes (default: 2)')
+    parser.add_argument('--duration', type=float, default=10., help='seconds per profile (default: 10)')
+    parser.add_argument('--profile', choices=list(profiles), nargs='+', default=list(profiles),
+                        help='profiles to run (default: all)')
+    args = parser.parse_args()
+
+    multiprocessing.set_start_method('fork' if os.name == 'posix' else 'spawn')
+    for profile in args.profile:
+        run(profile, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Startup-time budget of pi3ctrl-http and pi3ctrl-core.
+
+Starts fresh interpreters importing the uwsgi app (`pi3ctrl.wsgi`) and the core
+daemon module (`pi3ctrl.core`, against gpiozero mock pins) with a temporary
+config and reports the startup time against a budget. Exits non-zero when the
+median exceeds the budget or when startup has filesystem side effects.
+
+    python benchmarks/bench_startup.py --repeat 10 --http-budget 1.5 --core-budget 2.5
+"""
+# Absolute imports
+from argparse import ArgumentParser
+import os
+import subprocess
+import sys
+
+# Relative imports
+from common import format_ms, percentiles, temporary_config
+
+
+# Time the import in the child, excluding the interpreter start
+script = """
+from time import perf_counter
+start = perf_counter()
+import {module}
+print(perf_counter() - start)
+"""
+
+
+def measure(module: str, repeat: int, env: dict) -> list:
+    """Startup times in seconds of fresh interpreters importing `module`."""
+    timings = []
+    for _ in range(repeat):
+        p = subprocess.run([sys.executable, '-c', script.format(module=module)], env=env,
+                           capture_output=True, text=True, check=True)
+        timings.append(float(p.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='fresh starts per service (default: 10)')
+    parser.add_argument('--http-budget', type=float, default=1.5,
+                        help='median pi3ctrl-http startup budget in seconds (default: 1.5)')
+    parser.add_argument('--core-budget', type=float, default=2.5,
+                        help='median pi3ctrl-core startup budget in seconds (default: 2.5)')
+    args = parser.parse_args()
+
+    folder = temporary_config()
+    env = dict(os.environ, GPIOZERO_PIN_FACTORY='mock')
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [src, env.get('PYTHONPATH')]))
+
+    ok = True
+    for service, module, budget in (('pi3ctrl-http', 'pi3ctrl.wsgi', args.http_budget),
+                                    ('pi3ctrl-core', 'pi3ctrl.core', args.core_budget)):
+        timings = measure(module, args.repeat, env)
+        median = percentiles(timings, q=(50,))[50]
+        passed = median <= budget
+        ok &= passed
+        print(f"{service}: {format_ms(timings)} budget={1000 * budget:.0f}ms {'ok' if passed else 'OVER BUDGET'}")
+
+    # Startup should not create the database or the autohotspot config
+    created = sorted(set(os.listdir(folder)) - {'pi3ctrl.conf', 'soundFiles'})
+    if created:
+        ok = False
+        print(f"startup side effects: created {created}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# Absolute imports
+import os
+import tempfile
+
+
+__all__ = ['percentiles', 'temporary_config', 'temporary_settings', 'format_ms']
+
+
+def percentiles(values, q=(50, 95, 99)) -> dict:
+    """Nearest-rank percentiles of a list of values."""
+    values = sorted(values)
+    if not values:
+        return {p: float('nan') for p in q}
+    return {p: values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))] for p in q}
+
+
+def format_ms(values) -> str:
+    """Format the p50/p95/p99 of a list of seconds in milliseconds."""
+    p = percentiles(values)
+    return " ".join(f"p{k}={1000 * v:.2f}ms" for k, v in p.items())
+
+
+def temporary_settings(folder: str) -> dict:
+    """Settings of a temporary SQLite database, soundFile folder and core
+    socket in `folder`, for `create_app(test_config=...)` that skips the
+    PI3CTRL_CONFIG file.
+    """
+    return {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(folder, 'pi3ctrl.sqlite3')}",
+        'SOUNDFILE_FOLDER': os.path.join(folder, 'soundFiles'),
+        'CORE_SOCKET': os.path.join(folder, 'pi3ctrl-core.sock'),
+        'AUTOHOTSPOT_ENV_FILE': os.path.join(folder, 'pi3ctrl-autohotspot.env'),
+        'DEBUG': False,
+    }
+
+
+def temporary_config(**settings) -> str:
+    """Write a pi3ctrl config file with a temporary SQLite database, soundFile
+    folder and core socket, export it as PI3CTRL_CONFIG and return the folder.
+    """
+    folder = tempfile.mkdtemp(prefix='pi3ctrl-bench-')
+    settings = {**temporary_settings(folder), **settings}
+    os.makedirs(settings['SOUNDFILE_FOLDER'])
+    config = os.path.join(folder, 'pi3ctrl.conf')
+    with open(config, 'w') as f:
+        for key, value in settings.items():
+            f.write(f"{key} = {value!r}\n")
+    os.environ['PI3CTRL_CONFIG'] = config
+    return folder
@@ -1,12 +1,16 @@
 #!/bin/bash
 
-pip install .
-
 # apt
 sudo apt update
-sudo apt install -y rsyslog nginx dnsmasq hostapd
+sudo apt install -y rsyslog nginx dnsmasq hostapd libasound2-dev
 sudo apt purge -y dns-root-data
 
+pip install .[alsa]
+
+# static assets
+pi3ctrl-assets
+ln -sfn "$(pi3ctrl-assets --static-folder)" /opt/py3/share/pi3ctrl/static
+
 # /etc
 sudo rsync -amtv --chown=root:root etc/* /etc
 
@@ -36,6 +40,10 @@ sudo unlink /etc/nginx/sites-enabled/default
 sudo nginx -t
 sudo systemctl restart nginx
 
+# pi3ctrl-init
+sudo systemctl enable pi3ctrl-init.service
+sudo systemctl restart pi3ctrl-init.service
+
 # pi3ctrl-core
 sudo systemctl enable pi3ctrl-core.service 
 sudo systemctl restart pi3ctrl-core.service
@@ -48,5 +56,9 @@ sudo systemctl restart pi3ctrl-http.service
 sudo systemctl enable pi3ctrl-wifi.service 
 sudo systemctl restart pi3ctrl-wifi.service
 
+# pi3ctrl-archive
+sudo systemctl enable pi3ctrl-archive.timer
+sudo systemctl restart pi3ctrl-archive.timer
+
 # done
 exit 0
@@ -14,10 +14,10 @@ Python 3 event player for Raspberry Pi with GPIO control.
     This code is distributed under the terms of the MIT License.
 """
 
-from .app import create_app
+from .app import create_app, initialize
 from .database import db, Trigger
 
-__all__ = ['db', 'create_app', 'db', 'Trigger']
+__all__ = ['db', 'create_app', 'initialize', 'db', 'Trigger']
 
 # Version
 try:
@@ -1,22 +1,53 @@
 # Mandatory imports
 import hashlib
+import json
 import os
-import pandas as pd
 import shutil
 import socket
+from functools import partial
+from threading import BoundedSemaphore
+from time import monotonic
 from flask import (
     Flask,
+    Request,
+    Response,
+    current_app,
     jsonify,
     render_template,
     request,
-    send_from_directory
+    send_from_directory,
+    stream_with_context,
+    url_for
 )
+import click
 from flask_cors import CORS
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
 # from werkzeug.utils import secure_filename
 
 # Relative imports
-from .. import utils
-from ..database import db, Trigger
+from .. import ipc, utils
+from ..archive import archive_triggers, incremental_vacuum, vacuum
+from ..assets import load_manifest
+from ..export import export_formats, export_triggers
+from ..jobs import JobRunner
+from ..ring import RingReader
+from ..soundfiles import soundFile, Catalog, HashingFile, read_meta, read_variant, store_soundfile
+from ..database import (
+    db,
+    Trigger,
+    TriggerCount,
+    apply_sqlite_pragmas,
+    metric_buckets,
+    rebuild_trigger_counts,
+    select_triggers,
+    sqlite_engine_options,
+    trigger_metrics,
+    trigger_series,
+    upgrade_schema,
+    utcnow,
+    write_with_retry
+)
 version_not_found = "[VERSION-NOT-FOUND]"
 try:
     from ..version import version
@@ -24,17 +55,46 @@ except (ModuleNotFoundError, AssertionError):
     version = version_not_found
 
 
-def soundFile(button: int, pin: int) -> str:
-    """Construct the soundFile name.
+class UploadRequest(Request):
+    """Request streaming soundFile uploads straight into a hashing temporary
+    file in the soundFile folder.
     """
-    return f"soundFile.{button}.GPIO{pin}"
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.path == '/_soundfile':
+            return HashingFile(current_app.config['SOUNDFILE_FOLDER'])
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+# Prepare the filesystem and database
+def initialize(app: Flask):
+    """Export the autohotspot config and create or upgrade the database
+    tables. Run once before starting the services, see `pi3ctrl-init`.
+    """
+    with open(app.config['AUTOHOTSPOT_ENV_FILE'], "w") as file:
+        file.write(f"SSID={app.config['AUTOHOTSPOT_SSID']}\n")
+        file.write(f"PSK={app.config['AUTOHOTSPOT_PSK']}\n")
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        # fill the rollup counts of a database created before they existed
+        if db.session.query(Trigger.id).first() and not db.session.query(TriggerCount.count).first():
+            rebuild_trigger_counts()
+
+
+def init():
+    """Entry point of `pi3ctrl-init`."""
+    initialize(create_app())
 
 
 # Create the Flask app
-def create_app(test_config=None) -> Flask:
-    """Create and configure the Flask app
+def create_app(test_config=None, process: str = 'http') -> Flask:
+    """Create and configure the Flask app, with the database connection pool
+    of the `process`, `'http'` or `'core'`.
     """
     app = Flask(__name__, instance_relative_config=True)
+    app.request_class = UploadRequest
 
     app.json.compact = False
     app.json.sort_keys = False
@@ -67,41 +127,110 @@ def create_app(test_config=None) -> Flask:
     referers = (
         "http://127.0.0.1",
         f"http://{hostname.lower()}",
-        f"http://{utils.get_ipv4_address()}"
     )
 
-    # quick check for an internal request
+    # quick check for an internal request, the address is only looked up if needed
     def is_internal_referer():
         if 'Referer' not in request.headers:
             return False
-        return any(r in request.headers['Referer'] for r in referers)
+        if any(r in request.headers['Referer'] for r in referers):
+            return True
+        return f"http://{utils.get_ipv4_address()}" in request.headers['Referer']
 
-    # export autohotspot config
+    # expand autohotspot config
     for var in ('SSID', 'PSK'):
         app.config[f"AUTOHOTSPOT_{var}"] = utils.expand_env(app.config[f"AUTOHOTSPOT_{var}"])
-    with open("/tmp/pi3ctrl-autohotspot.env", "w") as file:
-        file.write(f"SSID={app.config['AUTOHOTSPOT_SSID']}\n")
-        file.write(f"PSK={app.config['AUTOHOTSPOT_PSK']}\n")
+
+    # index the soundFiles, scanned on first use
+    catalog = Catalog(app.config["SOUNDFILE_FOLDER"], logger=app.logger)
+    app.extensions['pi3ctrl_catalog'] = catalog
 
     # check if soundFiles exist
     def has_soundFile(button, pin):
-        file = os.path.join(app.config["SOUNDFILE_FOLDER"], soundFile(button, pin))
-        return os.path.isfile(file)
+        return catalog.get(button, pin) is not None
+
+    # fingerprinted static assets, if built
+    assets_manifest = load_manifest(app.static_folder)
+
+    def asset_url(filename):
+        return url_for('static', filename=assets_manifest.get(filename, filename))
 
     # prepare template globals
     context_globals = dict(
+        asset_url=asset_url,
         has_soundFile=has_soundFile,
+        soundFile_info=catalog.get,
         hostname=hostname.replace('.local', ''),
         services=utils.core_services + app.config['SYSTEMD_STATUS'],
         version=version,
     )
 
     # Initialize the database with the app
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options(app.config, process)
     db.init_app(app)
-
-    # Create the database tables
     with app.app_context():
-        db.create_all()
+        apply_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+
+    @app.cli.command('init')
+    def init_command():
+        """Create the database tables and export the autohotspot config."""
+        initialize(app)
+        print("Initialized pi3ctrl.")
+
+    @app.cli.command('rebuild-metrics')
+    def rebuild_metrics_command():
+        """Rebuild the trigger metrics rollup tables."""
+        print(f"Rebuilt metrics from {rebuild_trigger_counts()} triggers.")
+
+    @app.cli.command('archive-triggers')
+    @click.option('--days', type=int, default=None, help='Retention in days (default: TRIGGER_RETENTION_DAYS).')
+    @click.option('--no-vacuum', is_flag=True, help='Do not free the emptied database pages afterwards.')
+    def archive_triggers_command(days, no_vacuum):
+        """Move the triggers past the retention to the compressed archive."""
+        days = app.config['TRIGGER_RETENTION_DAYS'] if days is None else days
+        if days is None:
+            print("No trigger retention configured.")
+            return
+        folder = os.path.expandvars(app.config['TRIGGER_ARCHIVE_FOLDER'])
+        n = archive_triggers(
+            folder, days,
+            batch_size=app.config['TRIGGER_ARCHIVE_BATCH_SIZE'],
+            pause=app.config['TRIGGER_ARCHIVE_PAUSE'],
+            retries=app.config['TRIGGER_RETRIES'],
+            backoff=app.config['TRIGGER_RETRY_BACKOFF'],
+            logger=app.logger,
+        )
+        if n and not no_vacuum:
+            incremental_vacuum(
+                pages=app.config['TRIGGER_ARCHIVE_VACUUM_PAGES'],
+                pause=app.config['TRIGGER_ARCHIVE_PAUSE'],
+                retries=app.config['TRIGGER_RETRIES'],
+                backoff=app.config['TRIGGER_RETRY_BACKOFF'],
+                logger=app.logger,
+            )
+        print(f"Archived {n} triggers older than {days} days to {folder}.")
+
+    @app.cli.command('vacuum-database')
+    def vacuum_database_command():
+        """Rebuild the database file, with pi3ctrl-core stopped."""
+        vacuum()
+        print("Vacuumed the database.")
+
+    @app.cli.command('export-triggers')
+    @click.option('--format', 'fmt', type=click.Choice(list(export_formats)), default='csv', help='Export format.')
+    @click.option('--since', type=utils.parse_datetime, default=None, help='Start time, inclusive.')
+    @click.option('--until', type=utils.parse_datetime, default=None, help='End time, exclusive.')
+    @click.option('--button', 'buttons', type=int, multiple=True, help='Button to export, repeatable.')
+    @click.option('--after', type=int, default=None, help='Resume after this trigger id.')
+    @click.option('--output', type=click.File('wb'), default='-', help='Output file (default: stdout).')
+    @click.option('--gzip/--no-gzip', 'compress', default=None, help='Compress csv and ndjson (default: .gz output).')
+    def export_triggers_command(fmt, since, until, buttons, after, output, compress):
+        """Stream the triggers table to a csv, ndjson or parquet file."""
+        if compress is None:
+            compress = output.name.endswith('.gz')
+        stmt = select_triggers(since=since, until=until, buttons=list(buttons), after=after)
+        for chunk in export_triggers(stmt, fmt, compress, app.config['TRIGGER_STREAM_CHUNK']):
+            output.write(chunk)
 
     # inject template globals
     @app.context_processor
@@ -113,22 +242,44 @@ def create_app(test_config=None) -> Flask:
     def index():
         return render_template('base.html.jinja')
 
+    # rendered tabs only change with the config and the soundFiles
+    def json_default(obj):
+        return sorted(obj) if isinstance(obj, (set, frozenset)) else str(obj)
+
+    config_token = hashlib.sha256(json.dumps(
+        [version, hostname, dict(app.config)], sort_keys=True, default=json_default
+    ).encode()).hexdigest()
+    tab_cache = dict()
+
+    def tab_etag(tab):
+        return hashlib.sha256(f"{tab}:{config_token}:{catalog.token}".encode()).hexdigest()[:32]
+
     @app.route("/_tab/<tab>", methods=['GET'])
     def load_tab(tab="home"):
         if not is_internal_referer():
             return "Invalid request", 400
-        try:
-            html = render_template(f"tabs/{tab}.html.jinja")
-        except FileNotFoundError:
-            return f"Tab {tab} not found", 404
-        except Exception as e:
-            return f"Server Error: {e}", 500
-        resp = {
-            "succes": True,
-            "tab": tab,
-            "html": html,
-        }
-        return jsonify(resp), 200
+        etag = tab_etag(tab)
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            cached = tab_cache.get(tab)
+            if cached is None or cached[0] != etag:
+                try:
+                    html = render_template(f"tabs/{tab}.html.jinja")
+                except FileNotFoundError:
+                    return f"Tab {tab} not found", 404
+                except Exception as e:
+                    return f"Server Error: {e}", 500
+                body = app.json.dumps({
+                    "succes": True,
+                    "tab": tab,
+                    "html": html,
+                })
+                cached = tab_cache[tab] = (etag, body)
+            resp = Response(cached[1], mimetype='application/json')
+        resp.set_etag(etag)
+        resp.cache_control.no_cache = True
+        return resp
 
     @app.route("/_version", methods=['GET'])
     def multi_ear_version():
@@ -158,8 +309,7 @@ def create_app(test_config=None) -> Flask:
         passphrase = request.args.get('passphrase')
         if not (ssid and passphrase):
             return "Invalid ssid and/or passphrase arguments", 400
-        resp = utils.wifi_ssid_passphrase(ssid, passphrase)
-        return jsonify(resp), 200
+        return submit_job('wifi_connect', ssid=ssid, passphrase=passphrase)
 
     @app.route("/_autohotspot", methods=['POST'])
     def autohotspot():
@@ -170,8 +320,40 @@ def create_app(test_config=None) -> Flask:
         secret = request.args.get('secret')
         if secret != app.config['SECRET_SHA256']:
             return "Secret invalid", 403
-        resp = utils.wifi_autohotspot()
-        return jsonify(resp), 200
+        return submit_job('autohotspot')
+
+    def submit_job(name, **kwargs):
+        """Submit a job to pi3ctrl-core, answering with the job and its url.
+        Without the core, e.g. while fixing the network, the job runs within
+        the request and the finished job is returned.
+        """
+        try:
+            resp = ipc.request(app.config['CORE_SOCKET'], 'job_submit', name=name, **kwargs)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            app.logger.warning(f"pi3ctrl-core not available, running job {name} in-process: {e}")
+            func = partial(utils.job_functions[name], timeout=app.config['JOB_TIMEOUT_SECONDS'])
+            return jsonify(JobRunner().run(name, func, **kwargs).serialize), 200
+        except socket.timeout as e:
+            # the core may have accepted the job, running it here could run it twice
+            return f"pi3ctrl-core did not answer: {e}", 504
+        except OSError as e:
+            return f"pi3ctrl-core failed: {e}", 502
+        if not resp.pop('ok'):
+            return f"Job failed: {resp['error']}", 500
+        url = url_for('job_api', job_id=resp['id'])
+        return jsonify(dict(resp, url=url)), 202, {'Location': url}
+
+    @app.route("/_jobs/<job_id>", methods=['GET'])
+    def job_api(job_id):
+        if not is_internal_referer():
+            return "Invalid request", 403
+        try:
+            resp = ipc.request(app.config['CORE_SOCKET'], 'job', id=job_id)
+        except OSError as e:
+            return f"pi3ctrl-core not available: {e}", 503
+        if not resp.get('job'):
+            return "Job not found", 404
+        return jsonify(resp['job']), 200
 
     @app.route("/_ssid", methods=['GET'])
     def ssid_api():
@@ -216,9 +398,27 @@ def create_app(test_config=None) -> Flask:
         file = request.files['file']
         if file.filename == '':
             return "No selected file", 422
-        if file and allowed_file(file.filename, 'SOUNDFILE'):
-            file.save(os.path.join(app.config['SOUNDFILE_FOLDER'], soundFile(button, pin)))
-            return "File uploaded!", 200
+        if not allowed_file(file.filename, 'SOUNDFILE'):
+            return "File extension not allowed", 422
+        meta, error = store_soundfile(file.stream, catalog.path(button, pin), file.filename)
+        if error:
+            return f"Invalid file: {error}", 422
+        catalog.refresh(soundFile(button, pin))
+        return "File uploaded!", 200
+
+    @app.route('/_soundfile/meta', methods=['GET'])
+    def soundfile_meta():
+        if 'button' not in request.args:
+            return 'No button parameter provided', 422
+        button = int(request.args.get('button'))
+        pin = app.config['BUTTON_PINS'][button]
+        if catalog.get(button, pin) is None:
+            return "File not found", 404
+        meta = read_meta(catalog.path(button, pin))
+        if meta is None:
+            return "File not found", 404
+        meta['variant'] = read_variant(catalog.path(button, pin))  # None until pi3ctrl-core prepared it
+        return jsonify(meta), 200
 
     @app.route('/_soundfile', methods=['GET'])
     def download_soundfile():
@@ -228,64 +428,212 @@ def create_app(test_config=None) -> Flask:
         if 'pin' not in request.args:
             return 'No pin parameter provided', 422
         pin = int(request.args.get('pin'))
-        file = os.path.join(app.config["SOUNDFILE_FOLDER"], soundFile(button, pin))
-        if os.path.isfile(file):
-            return send_from_directory(app.config["SOUNDFILE_FOLDER"], soundFile(button, pin))
-        else:
+        entry = catalog.get(button, pin)
+        if entry is None:
             return "File not found", 403
-
-    def get_triggers():
-        return [trigger.serialize for trigger in Trigger.query.all()]
+        return send_from_directory(app.config["SOUNDFILE_FOLDER"], soundFile(button, pin),
+                                   etag=entry.sha256)
+
+    def get_trigger_filters():
+        """Parse the since, until, button and after query arguments."""
+        filters = dict()
+        for arg in ('since', 'until'):
+            if request.args.get(arg):
+                filters[arg] = utils.parse_datetime(request.args.get(arg))
+        buttons = [b for arg in request.args.getlist('button') for b in arg.split(',') if b]
+        if buttons:
+            filters['buttons'] = [int(b) for b in buttons]
+        if request.args.get('after'):
+            filters['after'] = int(request.args.get('after'))
+        return filters
+
+    def get_triggers(**filters):
+        return [trigger.serialize for trigger in db.session.scalars(select_triggers(**filters))]
+
+    def stream_triggers(**filters):
+        stmt = select_triggers(**filters).execution_options(yield_per=app.config['TRIGGER_STREAM_CHUNK'])
+        for trigger in db.session.scalars(stmt):
+            yield json.dumps(trigger.serialize) + "\n"
 
     @app.route('/_trigger/<int:button>/<int:pin>', methods=['GET'])
     def trigger(button, pin):
-        new_trigger = Trigger(button=button, pin=pin)
-        db.session.add(new_trigger)
-        db.session.commit()
-        return 'OK'
+        pins = app.config['BUTTON_PINS']
+        if not 0 <= button < len(pins) or pins[button] != pin:
+            return f"Unknown button {button} on GPIO{pin}", 404
+
+        # Press the button in pi3ctrl-core, which plays and records it
+        try:
+            resp = ipc.request(app.config['CORE_SOCKET'], 'press', button=button, pin=pin)
+        except OSError as e:
+            app.logger.warning(f"pi3ctrl-core not available, recording trigger as dropped: {e}")
+        else:
+            if not resp.pop('ok'):
+                return f"Trigger failed: {resp['error']}", 500
+            return jsonify(resp), 200
+
+        # Record the press that could not be played
+        try:
+            write_with_retry(
+                lambda session: session.add(Trigger(button=button, pin=pin, outcome='dropped')),
+                retries=app.config['TRIGGER_RETRIES'],
+                backoff=app.config['TRIGGER_RETRY_BACKOFF'],
+            )
+        except OperationalError as e:
+            app.logger.error(f"Failed to store trigger: {e}")
+            return "Database busy", 503
+        return jsonify(dict(button=button, pin=pin, outcome='dropped')), 503
+
+    # Recent triggers from the shared memory ring of pi3ctrl-core
+    ring = RingReader(app.config['RING_PATH'], logger=app.logger) if app.config['RING_PATH'] else None
+
+    def get_recent(since=None, limit: int = None) -> dict:
+        """Recent triggers newest first and the live counters of the core,
+        from the ring if it reaches back far enough, else from the database.
+        """
+        snapshot = ring.snapshot(since, limit) if ring is not None else None
+        if snapshot is not None and snapshot.pop('complete'):
+            return dict(source='ring', **snapshot)
+        stmt = select(Trigger).order_by(Trigger.id.desc()).limit(limit)
+        if since is not None:
+            stmt = stmt.where(Trigger.created >= since)
+        return dict(
+            source='database',
+            started=snapshot['started'] if snapshot else None,
+            counts=snapshot['counts'] if snapshot else None,
+            triggers=[trigger.serialize for trigger in db.session.scalars(stmt)],
+        )
+
+    @app.route('/_recent', methods=['GET'])
+    def recent_api():
+        try:
+            since = utils.parse_datetime(request.args['since']) if request.args.get('since') else None
+            limit = request.args.get('limit', app.config['TRIGGER_PAGE_SIZE'], type=int)
+        except ValueError as e:
+            return f"Invalid argument: {e}", 400
+        return jsonify(get_recent(since, max(1, min(limit, app.config['TRIGGER_PAGE_SIZE'])))), 200
+
+    @app.route('/_state', methods=['GET'])
+    def core_state():
+        try:
+            resp = ipc.request(app.config['CORE_SOCKET'], 'state')
+        except OSError as e:
+            return f"pi3ctrl-core not available: {e}", 503
+        resp.pop('ok')
+        return jsonify(resp), 200
 
     @app.route('/_triggers', methods=['GET'])
     def triggers_api():
-        # Query the triggers table
-        return jsonify(get_triggers()), 200
+        try:
+            filters = get_trigger_filters()
+            limit = request.args.get('limit', type=int)
+            if limit is not None and limit < 1:
+                raise ValueError(f"limit {limit} is not positive")
+        except ValueError as e:
+            return f"Invalid argument: {e}", 400
+
+        # Stream all matching triggers as newline delimited JSON
+        ndjson = 'application/x-ndjson'
+        if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == ndjson:
+            return Response(stream_with_context(stream_triggers(limit=limit, **filters)), mimetype=ndjson)
+
+        # Query a single page of the triggers table
+        limit = min(limit or app.config['TRIGGER_PAGE_SIZE'], app.config['TRIGGER_PAGE_SIZE'])
+        triggers = get_triggers(limit=limit, **filters)
+        resp = jsonify(triggers)
+        if len(triggers) == limit:
+            args = {**request.args.to_dict(flat=False), 'after': triggers[-1]['id']}
+            resp.headers['Link'] = f"<{url_for('triggers_api', **args)}>; rel=\"next\""
+        return resp, 200
+
+    @app.route('/_triggers/export', methods=['GET'])
+    def triggers_export():
+        try:
+            filters = get_trigger_filters()
+        except ValueError as e:
+            return f"Invalid argument: {e}", 400
+        fmt = request.args.get('format', 'csv')
+        if fmt not in export_formats:
+            return f"Unsupported format {fmt}", 400
+
+        # Stream the file, resume an interrupted download with after=<last id received>
+        compress = fmt != 'parquet' and request.args.get('compress', 'gzip') != 'none'
+        mimetype, extension = export_formats[fmt]
+        stream = export_triggers(select_triggers(**filters), fmt, compress, app.config['TRIGGER_STREAM_CHUNK'])
+        resp = Response(stream_with_context(stream), mimetype='application/gzip' if compress else mimetype)
+        filename = f"triggers.{extension}{'.gz' if compress else ''}"
+        resp.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        resp.headers['Accept-Ranges'] = 'none'
+        return resp
 
     def get_metrics():
-        # Triggers dataframe
-        df = pd.DataFrame.from_records([trigger.serialize for trigger in Trigger.query.all()])
-
-        if len(df) == 0:
-            return {}
-
-        # Convert the 'created' column to datetime
-        df['created'] = pd.to_datetime(df['created'])
-
-        # Create the 'bp' column
-        df['bp'] = df.apply(lambda row: f"button {row['button']} | GPIO{row['pin']}", axis=1)
-
-        # Extract the hour from the 'created' column
-        df['hour'] = df['created'].dt.hour
-
-        # Extract the weekday from the 'created' column (0=Monday, 6=Sunday)
-        df['weekday'] = df['created'].dt.weekday
-
-        # Extract the date from the 'created' column
-        df['date'] = df['created'].dt.strftime('%Y-%m-%d')
-
-        # Construct metrics
-        metrics = {}
-        metrics['last'] = {df.tail(1).bp.values[0]: df.tail(1).created.dt.strftime('%Y-%m-%d %H:%M:%S').values[0]}
-        metrics['total'] = dict()
-        for bp, grouped in df.groupby('bp'):
-            metrics['total'][bp] = len(grouped)
-            for metric in ('date', 'weekday', 'hour'):
-                if metric not in metrics:
-                    metrics[metric] = dict()
-                metrics[metric][bp] = grouped.groupby([metric]).size().to_dict()
-
-        return metrics
+        return trigger_metrics()
+
+    def get_metric_series():
+        """Trigger counts of the from, to, bucket and button query arguments."""
+        bucket = request.args.get('bucket', 'day')
+        if bucket not in metric_buckets:
+            raise ValueError(f"bucket should be one of {', '.join(metric_buckets)}")
+        _, length, window = metric_buckets[bucket]
+        until = utils.parse_datetime(request.args['to']) if request.args.get('to') else utcnow()
+        since = utils.parse_datetime(request.args['from']) if request.args.get('from') else until - window
+        if since >= until:
+            raise ValueError("from should be before to")
+        if (until - since) / length > app.config['METRICS_MAX_BUCKETS']:
+            raise ValueError(f"more than {app.config['METRICS_MAX_BUCKETS']} {bucket} buckets")
+        buttons = [int(b) for arg in request.args.getlist('button') for b in arg.split(',') if b]
+        return trigger_series(since, until, bucket, buttons)
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        try:
+            resp = ipc.request(app.config['CORE_SOCKET'], 'metrics')
+        except OSError as e:
+            return f"pi3ctrl-core not available: {e}", 503
+        if not resp.pop('ok'):
+            return f"pi3ctrl-core metrics failed: {resp['error']}", 503
+        return Response(resp['metrics'], mimetype='text/plain; version=0.0.4')
+
+    def stream_events():
+        """Relay the core events as server-sent events for a bounded time."""
+        yield f"retry: {int(1000 * app.config['EVENTS_RETRY_SECONDS'])}\n\n"
+        deadline = monotonic() + app.config['EVENTS_MAX_SECONDS']
+        try:
+            for event in ipc.subscribe(app.config['CORE_SOCKET'], timeout=2 * app.config['EVENTS_KEEPALIVE_SECONDS']):
+                if event['event'] == 'ping':
+                    yield ": ping\n\n"
+                else:
+                    yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                if monotonic() > deadline:
+                    return
+        except OSError:
+            # core not available, report the service status before closing
+            if is_RPi:
+                yield f"event: status\ndata: {json.dumps(utils.systemd_status_all())}\n\n"
+
+    # Every event stream holds a server thread, leave the others to the other routes
+    event_streams = BoundedSemaphore(app.config['EVENTS_MAX_STREAMS'])
+
+    @app.route('/_events', methods=['GET'])
+    def events_api():
+        retry = app.config['EVENTS_BUSY_RETRY_SECONDS']
+        if not event_streams.acquire(blocking=False):
+            return Response(f"retry: {int(1000 * retry)}\n\n", status=503, mimetype='text/event-stream',
+                            headers={'Retry-After': str(int(retry))})
+        resp = Response(stream_with_context(stream_events()), mimetype='text/event-stream')
+        resp.call_on_close(event_streams.release)
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.headers['X-Accel-Buffering'] = 'no'
+        return resp
 
     @app.route('/_metrics', methods=['GET'])
     def metrics_api():
         return jsonify(get_metrics()), 200
 
+    @app.route('/_metrics/series', methods=['GET'])
+    def metric_series_api():
+        try:
+            return jsonify(get_metric_series()), 200
+        except ValueError as e:
+            return f"Invalid argument: {e}", 400
+
     return app
@@ -1,6 +1,8 @@
 /* global bootstrap: false */
 let debug = window.location.hostname == '127.0.0.1'
 let statusUpdater = null;
+let events = null;
+let metricsTotals = {};
 
 
 Date.prototype.addSecs = function(s) {
@@ -130,6 +132,34 @@ function verifySecret() {
 }
 
 
+function waitForJob(job, interval = 1000) {
+
+    // poll a background job until it is done or failed
+    return new Promise((resolve, reject) => {
+
+        function poll() {
+
+            getResponse(job.url)
+            .then(resp => {
+
+                if (resp.status !== 200) { reject(resp.responseText); return; }
+                var state = JSON.parse(resp.responseText)
+                if (state.state === 'done' || state.state === 'failed') resolve(state)
+                else setTimeout(poll, interval)
+
+            })
+            .catch(reject)
+
+        }
+
+        if (job.state === 'done' || job.state === 'failed') resolve(job)
+        else setTimeout(poll, interval)
+
+    });
+
+}
+
+
 function add_ssid_psk(form, secret) {
 
     const ssid = form.elements["inputSSID"].value
@@ -138,16 +168,29 @@ function add_ssid_psk(form, secret) {
     getResponse("/_add_ssid_psk", { ssid: ssid, passphrase: psk, secret: secret }, 'POST')
     .then(resp => {
 
-        if (resp.status !== 200) {
+        if (resp.status !== 200 && resp.status !== 202) {
 
             alert("Error: " + resp.responseText)
+            return
 
-        } else {
+        }
 
-            alert("\"" + ssid + "\" added to the list of known wireless networks.")
-            resetForm(form)
+        waitForJob(JSON.parse(resp.responseText))
+        .then(job => {
 
-        }
+            if (job.state === 'done') {
+
+                alert("\"" + ssid + "\" added to the list of known wireless networks.")
+                resetForm(form)
+
+            } else {
+
+                alert("Error: " + (job.error || job.result.stderr))
+
+            }
+
+        })
+        .catch(error => alert("Error: " + error))
 
     });
 
@@ -163,15 +206,28 @@ function autohotspot() {
         getResponse("/_autohotspot", { secret: secret }, 'POST')
         .then(resp => {
 
-            if (resp.status !== 200) {
+            if (resp.status !== 200 && resp.status !== 202) {
 
                 alert("Error: " + resp.responseText)
+                return
 
-            } else {
+            }
 
-                alert("Wi-Fi autohotspot script triggered.\n\nConnection to the device could be lost.")
+            waitForJob(JSON.parse(resp.responseText))
+            .then(job => {
 
-            }
+                if (job.state === 'done') {
+
+                    alert("Wi-Fi autohotspot script completed.\n\nConnection to the device could be lost.")
+
+                } else {
+
+                    alert("Error: " + (job.error || job.result.stderr))
+
+                }
+
+            })
+            .catch(error => alert("Error: " + error + "\n\nConnection to the device could be lost."))
 
         });
 
@@ -180,78 +236,113 @@ function autohotspot() {
 }
 
 
+function sha256File(file) {
+
+    return file.arrayBuffer()
+    .then(buffer => CryptoJS.SHA256(CryptoJS.lib.WordArray.create(buffer)).toString())
+
+}
+
+
 function upload_soundfile(form, secret) {
 
     const files = document.getElementById("inputFile");
     const button = form.elements["inputButton"].value;
 
-    const formData = new FormData(form);
-
-    formData.append("file", files.files[0]);
-    formData.append("button", button);
-    formData.append("secret", secret);
-
-    const requestOptions = {
-        headers: {
-            "Content-Type": files.files[0].contentType,
-        },
-        mode: "no-cors",
-        method: "POST",
-        files: files.files[0],
-        body: formData,
-    };
-
-    fetch("_soundfile", requestOptions)
-    .then((resp) => {
-        if (resp.status !== 200) {
-            (resp.text()).then(data => {
-                alert("Error: " + data)
-            });
-        } else {
-            alert('File uploaded!');
+    // Skip the upload when the stored soundFile is identical
+    Promise.all([sha256File(files.files[0]), getResponse("/_soundfile/meta", { button: button })])
+    .then(([checksum, resp]) => {
+
+        if (resp.status === 200 && JSON.parse(resp.responseText).sha256 === checksum) {
+            alert('File unchanged, upload skipped.');
             resetForm(form)
+            return
         }
+
+        const formData = new FormData(form);
+
+        formData.append("file", files.files[0]);
+        formData.append("button", button);
+        formData.append("secret", secret);
+
+        const requestOptions = {
+            headers: {
+                "Content-Type": files.files[0].contentType,
+            },
+            mode: "no-cors",
+            method: "POST",
+            files: files.files[0],
+            body: formData,
+        };
+
+        fetch("_soundfile", requestOptions)
+        .then((resp) => {
+            if (resp.status !== 200) {
+                (resp.text()).then(data => {
+                    alert("Error: " + data)
+                });
+            } else {
+                alert('File uploaded!');
+                resetForm(form)
+            }
+        });
+
     });
 
 }
 
 
+function metricsLast(name, timestamp) {
+
+    var elem = document.querySelector('#metrics-last-button')
+    if (elem === null) return
+    elem.innerHTML = name
+    elem = document.querySelector('#metrics-last-timestamp')
+    elem.innerHTML = timestamp;
+
+}
+
+
+function metricsTotalsRender() {
+
+    var metrics = document.querySelector('#metrics-total')
+    if (metrics === null) return
+    metrics.innerHTML = ''
+    Object.keys(metricsTotals).forEach(function(key) {
+        metrics.innerHTML += ("<span class=\"badge text-bg-primary position-relative me-4\">" + key +
+                             "<span class=\"position-absolute top-0 start-100 translate-middle badge rounded-pill bg-danger\">" + metricsTotals[key] + "</span></span>");
+    })
+
+}
+
+
 function dataMetrics() {
 
+    // last and totals of all triggers, including the archived ones
     getResponse('/_metrics', {})
     .then(function(resp) {
 
         if (resp.status !== 200) return
 
-        var dataset = JSON.parse(resp.responseText)
+        var rollup = JSON.parse(resp.responseText)
 
         // last
-        var obj = dataset['last']
-        var elem = document.querySelector('#metrics-last-button')
-        elem.innerHTML = Object.keys(obj)[0]
-        elem = document.querySelector('#metrics-last-timestamp')
-        elem.innerHTML = obj[Object.keys(obj)[0]];
+        var obj = rollup['last']
+        if (Object.keys(obj).length) metricsLast(Object.keys(obj)[0], obj[Object.keys(obj)[0]])
 
         // totals
-        var metrics = document.querySelector('#metrics-total')
-        var totals = dataset['total']
-        Object.keys(totals).forEach(function(key) {
-            metrics.innerHTML += ("<span class=\"badge text-bg-primary position-relative me-4\">" + key +
-                                 "<span class=\"position-absolute top-0 start-100 translate-middle badge rounded-pill bg-danger\">" + totals[key] + "</span></span>");
-        })
+        metricsTotals = rollup['total']
+        metricsTotalsRender()
 
-        // date series data
-        const dateSeries = Object.keys(dataset.date).map(button => {
-            const data = Object.entries(dataset.date[button]).map(([date, count]) => {
-                const timestamp = new Date(date).getTime(); // Convert date to timestamp
-                return [timestamp, count];
-            });
-
-            return {
-                name: button,
-                data: data.sort((a, b) => a[0] - b[0]) // Ensure data is sorted by date
-            };
-        });
+    })
+
+    // daily counts of the last year, grouped by the server as Highcharts series
+    getResponse('/_metrics/series', { bucket: 'day' })
+    .then(function(resp) {
+
+        if (resp.status !== 200) return
+
+        var dataset = JSON.parse(resp.responseText)
 
         // date line chart
         Highcharts.chart('highcharts-date', {
@@ -281,24 +372,10 @@ function dataMetrics() {
                     lineWidth: 0  // Disable connecting lines
                 }
             },
-            series: dateSeries,
+            series: dataset.series,
             backgroundColor: 'none'
         });
 
-        // hour series data
-        const hourSeries = Object.keys(dataset.hour).map(button => {
-            const data = Array(24).fill(0);  // Initialize an array for 24 hours
-  
-            Object.entries(dataset.hour[button]).forEach(([hour, count]) => {
-                data[parseInt(hour)] = count;  // Assign the count to the respective hour
-            });
-
-            return {
-                name: button,
-                data: data
-            };
-        });
-
         // hour column chart
         Highcharts.chart('highcharts-hour', {
             chart: {
@@ -308,7 +385,7 @@ function dataMetrics() {
                 text: 'Button Activity by Hour of the Day'
             },
             xAxis: {
-                categories: [...Array(24).keys()],  // Generates an array [0, 1, 2, ..., 23]
+                categories: dataset.hour.categories,
                 title: {
                     text: 'Hour of the Day'
                 }
@@ -319,27 +396,10 @@ function dataMetrics() {
                 },
                 allowDecimals: false
             },
-            series: hourSeries,
+            series: dataset.hour.series,
             backgroundColor: 'none'
         });
 
-        // Map the weekday numbers to names
-        const weekdays = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"];
-
-        // weekday series
-        const weekdaySeries = Object.keys(dataset.weekday).map(button => {
-            const data = Array(7).fill(0);  // Initialize an array for 7 days
-
-            Object.entries(dataset.weekday[button]).forEach(([weekday, count]) => {
-                data[parseInt(weekday)] = count;  // Assign the count to the respective weekday
-            });
-
-            return {
-                name: button,
-                data: data
-            };
-        });
-
         // weekday column chart
         Highcharts.chart('highcharts-weekday', {
             chart: {
@@ -349,7 +409,7 @@ function dataMetrics() {
                 text: 'Button Activity by Day of the Week'
             },
             xAxis: {
-                categories: weekdays,  // ["Sunday", "Monday", "Tuesday", ...]
+                categories: dataset.weekday.categories,
                 title: {
                     text: 'Day of the Week'
                 }
@@ -360,7 +420,7 @@ function dataMetrics() {
                 },
                 allowDecimals: false
             },
-            series: weekdaySeries,
+            series: dataset.weekday.series,
             backgroundColor: 'none'
         });
 
@@ -397,33 +457,14 @@ function updateStorage() {
 
 function statusUpdateLoop() {
 
-    const progressbar = document.querySelector('#statusUpdater')
-    if (progressbar === null) { return; }
-
+    // service changes are pushed as events, poll only while not subscribed
     clearInterval(statusUpdater);
-    let width = 0;
-
-    statusUpdater = setInterval(progressBarWidth, 100);  // ms, times 100 gives 10s
+    statusUpdater = setInterval(function() {
+        if (events === null || events.readyState !== EventSource.OPEN) statusUpdate()
+    }, 10000);
 
     updateStorage()
 
-    function progressBarWidth() {
-
-        if (width == 100) {
-
-            width = 0;
-            statusUpdate()
-
-        } else {
-
-            width++;
-
-        }
-
-        progressbar.style.width = width + '%';
- 
-    }
-
 }
 
 
@@ -434,67 +475,72 @@ function statusUpdate() {
 
         if (resp.status !== 200) return
 
-        var data = JSON.parse(resp.responseText)
+        statusRender(JSON.parse(resp.responseText))
+
+    })
+
+}
 
-        for (const [service, response] of Object.entries(data)) {
 
-            var id = '#' + service.replace('.', '-')
-            var obj_status = document.querySelector(id + '-status')
-            var obj_response = document.querySelector(id + '-response > .accordion-body')
+function statusRender(data) {
 
-            if (response.returncode === null) continue
+    for (const [service, response] of Object.entries(data)) {
 
-            if (response.returncode === 4) {
+        var id = '#' + service.replace('.', '-')
+        var obj_status = document.querySelector(id + '-status')
+        var obj_response = document.querySelector(id + '-response > .accordion-body')
 
-                obj_response.innerHTML = response.stderr
-                obj_status.innerHTML = 'not found'
+        if (obj_status === null || response.returncode === null) continue
 
-                if (!obj_status.classList.contains('bg-secondary')) {
+        if (response.returncode === 4) {
 
-                    obj_status.classList.remove('bg-success', 'bg-warning', 'bg-danger')
-                    obj_status.classList.add('bg-secondary')
+            obj_response.innerHTML = response.stderr
+            obj_status.innerHTML = 'not found'
 
-                }
+            if (!obj_status.classList.contains('bg-secondary')) {
 
-                continue;
+                obj_status.classList.remove('bg-success', 'bg-warning', 'bg-danger')
+                obj_status.classList.add('bg-secondary')
 
             }
 
-            obj_response.innerHTML = response.stdout
-            obj_status.innerHTML = response.status
+            continue;
 
-            if (response.returncode === 0) {
+        }
 
-                if (!obj_status.classList.contains('bg-success')) {
+        obj_response.innerHTML = response.stdout
+        obj_status.innerHTML = response.status
 
-                    obj_status.classList.remove('bg-secondary', 'bg-warning', 'bg-danger')
-                    obj_status.classList.add('bg-success')
+        if (response.returncode === 0) {
 
-                }
+            if (!obj_status.classList.contains('bg-success')) {
 
-            } else if (response.status.includes('activating') || response.status.includes('inactive')) {
+                obj_status.classList.remove('bg-secondary', 'bg-warning', 'bg-danger')
+                obj_status.classList.add('bg-success')
 
-                if (!obj_status.classList.contains('bg-warning')) {
+            }
 
-                    obj_status.classList.remove('bg-secondary', 'bg-success', 'bg-danger')
-                    obj_status.classList.add('bg-warning')
+        } else if (response.status.includes('activating') || response.status.includes('inactive')) {
 
-                }
+            if (!obj_status.classList.contains('bg-warning')) {
 
-            } else {
+                obj_status.classList.remove('bg-secondary', 'bg-success', 'bg-danger')
+                obj_status.classList.add('bg-warning')
 
-                if (!obj_status.classList.contains('bg-danger')) {
+            }
 
-                    obj_status.classList.remove('bg-secondary', 'bg-success', 'bg-warning')
-                    obj_status.classList.add('bg-danger')
+        } else {
 
-                }
+            if (!obj_status.classList.contains('bg-danger')) {
+
+                obj_status.classList.remove('bg-secondary', 'bg-success', 'bg-warning')
+                obj_status.classList.add('bg-danger')
 
             }
 
         }
 
-    })
+    }
 
 }
 
@@ -588,10 +634,39 @@ function loadContent(nav) {
 }
 
 
+function subscribeEvents() {
+
+    if (!window.EventSource) return
+
+    events = new EventSource('/_events')
+
+    events.addEventListener('trigger', function(event) {
+        var trigger = JSON.parse(event.data)
+        metricsLast(trigger.name, trigger.created)
+        metricsTotals[trigger.name] = (metricsTotals[trigger.name] || 0) + 1
+        metricsTotalsRender()
+    })
+
+    events.addEventListener('status', function(event) {
+        statusRender(JSON.parse(event.data))
+    })
+
+    // refused while the server is busy, the browser does not reconnect by itself: poll meanwhile
+    events.onerror = function() {
+        if (events.readyState !== EventSource.CLOSED) return
+        events.close()
+        events = null
+        setTimeout(subscribeEvents, 30000)
+    }
+
+}
+
+
 (function () {
 
     'use strict'
 
+    subscribeEvents();
     loadContent();
     getRelease();
 
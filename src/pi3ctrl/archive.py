@@ -0,0 +1,175 @@
+# Absolute imports
+from collections import Counter
+from datetime import timedelta
+from logging import Logger
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.exc import OperationalError
+from time import sleep
+import csv
+import gzip
+import io
+import os
+
+# Relative imports
+from .database import db, Trigger, TriggerCount, count_keys, dump_datetime, is_busy_error, write_with_retry, utcnow
+
+
+__all__ = ['archive_path', 'archive_triggers', 'incremental_vacuum', 'vacuum']
+
+
+archive_columns = ('id', 'button', 'pin', 'created', 'outcome')
+
+
+def archive_path(folder: str, day) -> str:
+    """Archive file of the triggers of a day, partitioned by year."""
+    return os.path.join(folder, day.strftime('%Y'), f"triggers-{day.strftime('%Y-%m-%d')}.csv.gz")
+
+
+def write_archive(folder: str, rows: list) -> list:
+    """Append trigger rows to the gzipped csv file of their day and flush them
+    to disk. Returns the files written.
+    """
+    days = dict()
+    for row in rows:
+        days.setdefault(row.created.date(), []).append(row)
+
+    paths = []
+    for day, day_rows in days.items():
+        path = archive_path(folder, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        new = not os.path.exists(path)
+        # every batch is a gzip member, concatenated members read as one file
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as gz:
+                f = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+                writer = csv.writer(f)
+                if new:
+                    writer.writerow(archive_columns)
+                writer.writerows(
+                    (row.id, row.button, row.pin, dump_datetime(row.created), row.outcome)
+                    for row in day_rows
+                )
+                f.flush()
+                f.detach()
+            raw.flush()
+            os.fsync(raw.fileno())
+        paths.append(path)
+    return paths
+
+
+def archive_counts(session, rows: list):
+    """Mark the counts of the archived trigger rows as archived."""
+    counts = Counter()
+    for row in rows:
+        for metric, value in count_keys(row.created).items():
+            counts[(row.button, row.pin, metric, value)] += 1
+
+    table = TriggerCount.__table__
+    for (button, pin, metric, value), count in counts.items():
+        key = dict(button=button, pin=pin, metric=metric, value=value)
+        result = session.execute(
+            update(table)
+            .where(*[table.c[k] == v for k, v in key.items()])
+            .values(archived=table.c.archived + count)
+        )
+        if result.rowcount == 0:
+            session.execute(insert(table).values(count=count, archived=count, **key))
+
+
+def archive_triggers(folder: str, days: int, batch_size: int = 1000, pause: float = .1,
+                     retries: int = 5, backoff: float = .05, logger: Logger = None) -> int:
+    """Move the triggers older than `days` days to the gzipped csv files per
+    day in `folder`, oldest first in batches of `batch_size` rows. The rollup
+    counts are kept. Returns the number of triggers archived. Requires an app
+    context.
+
+    Each batch is written to disk before it is removed from the database in a
+    short transaction, followed by a `pause` to let the other writers in. A
+    batch interrupted in between is archived again by the next run: archive
+    readers should drop duplicate ids.
+    """
+    cutoff = utcnow() - timedelta(days=days)
+    stmt = (
+        select(Trigger.id, Trigger.button, Trigger.pin, Trigger.created, Trigger.outcome)
+        .where(Trigger.created < cutoff)
+        .order_by(Trigger.id)
+        .limit(batch_size)
+    )
+    total = 0
+    while True:
+        rows = db.session.execute(stmt).all()
+        db.session.rollback()  # end the read transaction before writing
+        if not rows:
+            break
+        write_archive(folder, rows)
+
+        def remove(session):
+            archive_counts(session, rows)
+            session.execute(delete(Trigger).where(Trigger.id.in_([row.id for row in rows])))
+
+        write_with_retry(remove, retries=retries, backoff=backoff)
+        total += len(rows)
+        if isinstance(logger, Logger):
+            logger.info(f"Archived {total} triggers up to {dump_datetime(rows[-1].created)}")
+        if len(rows) < batch_size:
+            break
+        sleep(pause)
+    return total
+
+
+def incremental_vacuum(pages: int = 256, pause: float = .1, retries: int = 5, backoff: float = .05,
+                       logger: Logger = None) -> int:
+    """Return the free pages of the SQLite database file to the file system,
+    `pages` pages per short write transaction followed by a `pause` to let
+    the other writers in. Requires `auto_vacuum=INCREMENTAL`, see `vacuum`.
+    Returns the number of pages freed. Requires an app context.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return 0
+    db.session.remove()
+    freed = 0
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if connection.execute(text('PRAGMA auto_vacuum')).scalar() != 2:
+            if isinstance(logger, Logger):
+                logger.warning("Database auto_vacuum is not incremental, run vacuum-database once to enable it.")
+            return 0
+        free = connection.execute(text('PRAGMA freelist_count')).scalar()
+        while free:
+            n = min(pages, free)
+            for attempt in range(retries + 1):
+                try:
+                    # every step of the pragma frees a single page
+                    connection.execute(text('BEGIN IMMEDIATE'))
+                    for _ in range(n):
+                        connection.execute(text('PRAGMA incremental_vacuum'))
+                    connection.execute(text('COMMIT'))
+                    break
+                except OperationalError as e:
+                    if connection.connection.driver_connection.in_transaction:
+                        connection.execute(text('ROLLBACK'))
+                    if attempt == retries or not is_busy_error(e):
+                        raise
+                    sleep(backoff * 2 ** attempt)
+            left = connection.execute(text('PRAGMA freelist_count')).scalar()
+            if left >= free:
+                break
+            freed += free - left
+            free = left
+            sleep(pause)
+    if isinstance(logger, Logger):
+        logger.info(f"Freed {freed} database pages")
+    return freed
+
+
+def vacuum():
+    """Rebuild the database file with `auto_vacuum=INCREMENTAL` and truncate
+    the write-ahead log. Locks the database for the whole rebuild: run it
+    as maintenance with pi3ctrl-core stopped. Requires an app context.
+    """
+    db.session.remove()
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if db.engine.dialect.name == 'sqlite':
+            connection.execute(text('PRAGMA auto_vacuum=INCREMENTAL'))
+        connection.execute(text('VACUUM'))
+        if db.engine.dialect.name == 'sqlite':
+            connection.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
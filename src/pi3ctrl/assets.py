@@ -0,0 +1,129 @@
+# Absolute imports
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+# Optional imports
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+__all__ = ['assets', 'build_assets', 'load_manifest']
+
+
+# Static folder of the app and the build output in it
+static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'static')
+dist = 'dist'
+manifest_file = 'manifest.json'
+
+
+# Static assets used by the templates, relative to the static folder
+assets = (
+    '3rd/bootstrap-5.3.3/bootstrap.min.css',
+    '3rd/bootstrap-5.3.3/bootstrap.bundle.min.js',
+    '3rd/bootstrap-icons-1.11.3/bootstrap-icons.min.css',
+    '3rd/highcharts-9.3.1/highcharts.js',
+    '3rd/highcharts-9.3.1/modules/exporting.js',
+    '3rd/highcharts-9.3.1/modules/export-data.js',
+    '3rd/crypto-js-4.1.1/core.js',
+    '3rd/crypto-js-4.1.1/lib-typedarrays.js',
+    '3rd/crypto-js-4.1.1/sha256.js',
+    'css/pi3ctrl.css',
+    'js/get-response.js',
+    'js/show-password-toggle.min.js',
+    'js/pi3ctrl.js',
+)
+
+
+# Files referenced by relative url from a stylesheet keep their name
+unhashed_assets = (
+    '3rd/bootstrap-icons-1.11.3/fonts/bootstrap-icons.woff2',
+    '3rd/bootstrap-icons-1.11.3/fonts/bootstrap-icons.woff',
+)
+
+
+# Already compressed formats
+compressed_extensions = ('.woff', '.woff2', '.png', '.jpg', '.gif')
+
+
+def fingerprint(filename: str, data: bytes) -> str:
+    """Filename with the content hash inserted before the extension."""
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def write_asset(folder: str, filename: str, data: bytes):
+    """Write an asset with its gzip and, if available, brotli variant."""
+    path = os.path.join(folder, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if filename.endswith(compressed_extensions):
+        return
+    with open(f"{path}.gz", 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(f"{path}.br", 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build_assets(folder: str = static_folder) -> dict:
+    """Build the fingerprinted and precompressed assets into `dist` of the
+    static folder and return the manifest mapping the asset names to the
+    built names.
+    """
+    output = os.path.join(folder, dist)
+    tmp = f"{output}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    manifest = dict()
+    for filename in assets + unhashed_assets:
+        with open(os.path.join(folder, filename), 'rb') as f:
+            data = f.read()
+        built = filename if filename in unhashed_assets else fingerprint(filename, data)
+        write_asset(tmp, built, data)
+        manifest[filename] = f"{dist}/{built}"
+
+    with open(os.path.join(tmp, manifest_file), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(output, ignore_errors=True)
+    os.replace(tmp, output)
+    return manifest
+
+
+def load_manifest(folder: str = static_folder) -> dict:
+    """Load the manifest of the built assets, empty if not built."""
+    try:
+        with open(os.path.join(folder, dist, manifest_file)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+
+def main():
+    """Build the static assets of the pi3ctrl web app."""
+    parser = argparse.ArgumentParser(
+        prog='pi3ctrl-assets',
+        description='Build fingerprinted and precompressed static assets of the pi3ctrl web app.',
+    )
+    parser.add_argument('--static-folder', action='store_true',
+                        help='Print the static folder of the app and exit.')
+    args = parser.parse_args()
+
+    if args.static_folder:
+        print(static_folder)
+        return
+
+    manifest = build_assets()
+    print(f"Built {len(manifest)} assets in {os.path.join(static_folder, dist)}"
+          f"{'' if brotli else ' (brotli not available, gzip only)'}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,7 @@ import os
 from flask import Config
 
 
-__all__ = ['DefaultConfig', 'get_config']
+__all__ = ['DefaultConfig', 'config_files', 'get_config']
 
 
 class DefaultConfig(object):
@@ -22,27 +22,113 @@ class DefaultConfig(object):
 
     BUTTON_PINS = [17, 27, 22]
     BUTTON_OFF_SECONDS = 5
+    BUTTON_DEBOUNCE_SECONDS = .3
+
+    PRESS_POLICY = 'drop'  # drop, queue, preempt or mix presses while playing
+    PRESS_QUEUE_SIZE = 4
+
+    CORE_SOCKET = '/tmp/pi3ctrl-core.sock'
+
+    EVENTS_KEEPALIVE_SECONDS = 15
+    EVENTS_MAX_SECONDS = 300  # close event streams after, the browser reconnects
+    EVENTS_MAX_STREAMS = 2  # concurrent event streams per http process, each holds a thread
+    EVENTS_BUSY_RETRY_SECONDS = 30  # reconnect delay of an event stream refused while busy
+    EVENTS_RETRY_SECONDS = 5
+    EVENTS_STATUS_SECONDS = 5  # systemd status poll interval of the core while subscribed
+
+    # Shared memory ring of the recent triggers written by the core, None disables it
+    RING_PATH = '/dev/shm/pi3ctrl-triggers'
+    RING_SLOTS = 4096
+
+    JOB_WORKERS = 1
+    JOB_RETENTION_SECONDS = 600
+    JOB_TIMEOUT_SECONDS = 45  # system calls running longer are killed, below the 60s proxy read timeout
 
     LED = True
     LED_ON_SECONDS = .5
     LED_OFF_SECONDS = 1.5
     LED_PINS = [18, 23, 24]
+    LED_ERROR_SECONDS = 2
+    # LED patterns as repeating (value, seconds) steps, a step of None seconds is held.
+    # Built-in are 'off', 'standby' and 'blink' (LED_ON_SECONDS on, LED_OFF_SECONDS off).
+    LED_PATTERNS = {
+        'error': [(1, .1), (0, .1)],
+    }
+    LED_PATTERNS_PER_PIN = {}  # LED pin: {pattern: steps}
 
     SOUNDFILE_ALLOWED_EXTENSIONS = {'wav', 'raw', 'pcm'}
     SOUNDFILE_FOLDER = 'soundFiles'
-    SOUNDFILE_PLAYER = '/usr/bin/aplay'
+    SOUNDFILE_PLAYER = 'alsa'  # in-process engine (the alsa extra), or the command of a player such as '/usr/bin/aplay'
+    SOUNDFILE_FALLBACK_PLAYER = '/usr/bin/aplay'  # used without pyalsaaudio
+    SOUNDFILE_DEVICE = 'default'
+    SOUNDFILE_PERIODSIZE = 1024
+    # Uploads are prepared into a playback-ready variant in the output format
+    SOUNDFILE_OUTPUT_FORMAT = (2, 2, 48000)  # channels, sample width in bytes, rate
+    SOUNDFILE_RAW_FORMAT = (1, 1, 8000)  # format of raw and pcm uploads, the aplay default
+    SOUNDFILE_LOUDNESS = None  # RMS level in dBFS to normalize to, None keeps the level
+    SOUNDFILE_PEAK = -1.  # peak limit in dBFS when normalizing
+    SOUNDFILE_TRIM_SILENCE = -60.  # trim leading samples below this level in dBFS, None keeps them
 
     MAX_CONTENT_LENGTH = 512 * 1000 * 1000  # 512MB
 
     SYSTEMD_STATUS = []
+    SYSTEMD_STATUS_TTL = 5
 
     # Database
     SQLALCHEMY_DATABASE_URI = 'sqlite:///pi3ctrl.sqlite3'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    # SQLite PRAGMAs of every connection, journal_mode is persistent, auto_vacuum applies to new databases
+    SQLITE_PRAGMAS = {
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # ms
+    }
+    # connection pool per process: uwsgi worker threads or the core writer and socket threads
+    SQLITE_POOL = {
+        'http': {'pool_size': 8, 'max_overflow': 0, 'pool_timeout': 10},
+        'core': {'pool_size': 2, 'max_overflow': 2, 'pool_timeout': 10},
+    }
+
+    TRIGGER_BATCH_SIZE = 50
+    TRIGGER_PAGE_SIZE = 1000
+    TRIGGER_STREAM_CHUNK = 500
+    TRIGGER_FLUSH_SECONDS = 1.
+    TRIGGER_COMMIT_ATTEMPTS = 5  # failed batch commits before committing its triggers one by one
+    TRIGGER_QUEUE_SIZE = 10000  # queued triggers beyond are dropped
+    TRIGGER_RETRIES = 5
+    TRIGGER_RETRY_BACKOFF = .05  # seconds, doubled on every retry
+    # triggers older than the retention are moved to daily gzipped csv files, None keeps all
+    TRIGGER_RETENTION_DAYS = 365
+    TRIGGER_ARCHIVE_FOLDER = 'archive'
+    TRIGGER_ARCHIVE_BATCH_SIZE = 1000
+    TRIGGER_ARCHIVE_PAUSE = .1  # seconds between batches
+    TRIGGER_ARCHIVE_VACUUM_PAGES = 256  # free pages returned to the file system per transaction
+    # /_metrics time series, largest number of buckets of a query
+    METRICS_MAX_BUCKETS = 5000
+
+    # Fleet aggregator, polled units by name
+    FLEET_UNITS = {}  # e.g. {'hall': 'http://pi3ctrl-hall.local'}
+    FLEET_DATABASE_URI = 'sqlite:///pi3ctrl-fleet.sqlite3'
+    FLEET_INTERVAL = 60.  # seconds
+    FLEET_TIMEOUT = (3.05, 10.)  # connect and read timeout in seconds
+    FLEET_WORKERS = 8
+    FLEET_MAX_BACKOFF = 900.  # seconds
 
     # Autohotspot
     AUTOHOTSPOT_SSID = '${HOSTNAME}'
     AUTOHOTSPOT_PSK = 'ChangePassword!'
+    AUTOHOTSPOT_ENV_FILE = '/tmp/pi3ctrl-autohotspot.env'
+
+
+def config_files() -> list:
+    """The config files read by `get_config` on top of the defaults."""
+    files = ['/etc/pi3ctrl/pi3ctrl.conf']
+    if os.environ.get('PI3CTRL_CONFIG') is not None:
+        files.append(os.environ['PI3CTRL_CONFIG'])
+    return files
 
 
 def get_config():
@@ -1,19 +1,30 @@
 # Absolute imports
+from functools import partial
 from gpiozero import Button, LED
 from gpiozero.exc import CallbackSetToNone
-from threading import Thread, Event, Lock
-from time import sleep
+from queue import Queue, Empty
+from threading import Event, Lock, Thread
+from time import perf_counter
+import logging
 import os
 import signal
-import subprocess
 import sys
 import warnings
 
 # Relative imports
 from .app import create_app
-from .database import db, Trigger
-from .config import get_config
-from .utils import get_logger
+from .database import TriggerWriter, button_pin, dump_datetime, utcnow
+from .ingest import ensure_variant, ingest_settings
+from .inotify import DirectoryWatcher
+from .config import config_files, get_config
+from .ipc import CoreServer
+from .jobs import JobRunner
+from .player import get_player
+from .ring import TriggerRing
+from .scheduler import Scheduler
+from .soundfiles import Catalog
+from .telemetry import registry
+from .utils import core_services, get_logger, is_RPi, job_functions, systemd_show
 
 
 __all__ = []
@@ -54,108 +65,557 @@ _buttons = [IndexedButton(pin, index=i) for i, pin in enumerate(_config['BUTTON_
 _leds = [IndexedLED(pin, index=i) for i, pin in enumerate(_config['LED_PINS'])]
 
 
-# Init command lock
+# Create the app once and the write-behind trigger queue
+_app = create_app(process='core')
+_writer = TriggerWriter(
+    _app,
+    batch_size=_config['TRIGGER_BATCH_SIZE'],
+    flush_seconds=_config['TRIGGER_FLUSH_SECONDS'],
+    attempts=_config['TRIGGER_COMMIT_ATTEMPTS'],
+    queue_size=_config['TRIGGER_QUEUE_SIZE'],
+    logger=_logger,
+)
+
+
+# Create the scheduler driving the LED patterns and button debounce
+_scheduler = Scheduler(logger=_logger)
+
+
+# Create the soundFile catalog and player
+_catalog = Catalog(os.path.expandvars(_config['SOUNDFILE_FOLDER']), logger=_logger)
+_player = get_player(_config, logger=_logger)
+
+
+# Create the local control socket
+_server = CoreServer(_config['CORE_SOCKET'], logger=_logger, keepalive=_config['EVENTS_KEEPALIVE_SECONDS'])
+
+
+# Create the shared memory ring of the recent triggers, read by the http workers
+try:
+    _ring = TriggerRing(_config['RING_PATH'], slots=_config['RING_SLOTS']) if _config['RING_PATH'] else None
+except OSError as e:
+    _logger.warning(f"Trigger ring {_config['RING_PATH']} not available: {e}")
+    _ring = None
+
+
+# Init command lock, guarding the press policy decisions
 _execute_command_lock = Lock()
 
 
+# Press policies
+press_policies = ('drop', 'queue', 'preempt', 'mix')
+
+
+# Press telemetry
+press_stage_seconds = registry.histogram(
+    'pi3ctrl_press_stage_seconds',
+    'Duration of the stages of a press: lock_wait, db_queue, led_setup, player_start and playback.',
+    labelnames=('stage',),
+)
+presses_total = registry.counter(
+    'pi3ctrl_presses_total', 'Number of presses by outcome.', labelnames=('outcome',)
+)
+playback_failures_total = registry.counter(
+    'pi3ctrl_playback_failures_total', 'Number of failed playbacks by player.', labelnames=('player',)
+)
+
+
+class Voice(Thread):
+    """Playback worker with its own player, playing the pressed buttons
+    submitted to its queue one after another.
+    """
+
+    def __init__(self, player, index: int):
+        super().__init__(name=f"pi3ctrl-voice-{index}", daemon=True)
+        self.player = player
+        self.queue = Queue()
+        self.pending = 0  # submitted presses not yet done, guarded by _execute_command_lock
+        self.generation = 0  # incremented on preemption, guarded by _execute_command_lock
+
+    @property
+    def busy(self) -> bool:
+        return self.pending > 0
+
+    def submit(self, button: Button, pressed: float = None):
+        """Submit a press. Call while holding the command lock."""
+        self.pending += 1
+        self.queue.put((button, self.generation, pressed or perf_counter()))
+
+    def preempt(self, button: Button, pressed: float = None):
+        """Stop the current playback and discard pending presses in favour of
+        the new press. Call while holding the command lock.
+        """
+        self.generation += 1
+        while True:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                break
+        self.pending = 0
+        self.player.stop()
+        self.submit(button, pressed)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            button, generation, pressed = item
+            with _execute_command_lock:
+                if generation != self.generation:
+                    continue
+                if button.closed:  # replaced by a config reload
+                    self.pending -= 1
+                    continue
+                self.player.ready()
+            success = False
+            try:
+                success = play_button(button, self.player, pressed)
+            finally:
+                with _execute_command_lock:
+                    if generation == self.generation:
+                        self.pending -= 1
+                if success:
+                    reset_leds(button)
+
+    def stop(self):
+        self.player.stop()
+        self.queue.put(None)
+        if self.is_alive():
+            self.join()
+
+
+class ServiceMonitor(Thread):
+    """Poll the systemd status of the services while events are subscribed
+    and publish the services that changed state.
+    """
+
+    def __init__(self, server: CoreServer, services: list, interval: float):
+        super().__init__(name='pi3ctrl-service-monitor', daemon=True)
+        self.server = server
+        self.services = services
+        self.interval = interval
+        self.status = dict()
+        self._stop_event = Event()
+
+    @staticmethod
+    def state(status: dict) -> tuple:
+        return status['status'], status['returncode'], (status['properties'] or dict()).get('MainPID')
+
+    def snapshot(self) -> list:
+        return [('status', dict(self.status))] if self.status else []
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self.server.subscribers:
+                status = systemd_show(self.services)
+                changed = {
+                    service: s for service, s in status.items()
+                    if service not in self.status or self.state(self.status[service]) != self.state(s)
+                }
+                self.status = status
+                if changed:
+                    self.server.publish('status', changed)
+            else:
+                self.status = dict()  # outdated once nobody listens
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+# Run the long system calls requested over the control socket
+_jobs = JobRunner(
+    max_workers=_config['JOB_WORKERS'],
+    retention=_config['JOB_RETENTION_SECONDS'],
+    logger=_logger,
+)
+
+
+# Monitor the services for the event subscribers
+_monitor = ServiceMonitor(_server, core_services + _config['SYSTEMD_STATUS'], _config['EVENTS_STATUS_SECONDS'])
+
+
+# Create a single voice, or one voice per button when mixing
+def create_voices(player, buttons: int, policy: str) -> list:
+    return [Voice(player if i == 0 else player.clone(), i) for i in range(buttons if policy == 'mix' else 1)]
+
+
+_voices = create_voices(_player, len(_buttons), _config['PRESS_POLICY'])
+
+
+# Function to construct the soundFile path of a button
+def soundfile_path(button: Button) -> str:
+    return _catalog.path(button.index, button.pin.number)
+
+
+# Function to get the LED patterns, with the blink pattern defaulting to the LED on/off seconds
+def get_led_patterns(led: LED) -> dict:
+    config = _config
+    patterns = dict(
+        off=[(0, None)],
+        standby=[(1, None)],
+        blink=[(1, config['LED_ON_SECONDS']), (0, config['LED_OFF_SECONDS'])],
+    )
+    patterns.update(config['LED_PATTERNS'])
+    patterns.update(config['LED_PATTERNS_PER_PIN'].get(led.pin.number, dict()))
+    return patterns
+
+
+# Function to set the pattern of an LED
+def set_led_pattern(led: LED, pattern: str):
+    _scheduler.animate(led, get_led_patterns(led)[pattern], lambda value: setattr(led, 'value', value))
+
+
 # Function to set LEDs to standby mode
 def set_leds_standby():
     leds = _leds
     for led in leds:
-        led.on()
+        set_led_pattern(led, 'standby')
 
 
-# Function to blink LED with an event to stop blinking
-def blink_led(led, stop_event):
-    config = _config
-    while not stop_event.is_set():
-        led.on()
-        sleep(config['LED_ON_SECONDS'])
-        led.off()
-        sleep(config['LED_OFF_SECONDS'])
+# Function to reset LEDs to standby mode after playback of a button
+def reset_leds(button: Button):
+    with _execute_command_lock:
+        idle = not any(voice.busy for voice in _voices)
+    if idle:
+        set_leds_standby()
+    elif _config['PRESS_POLICY'] == 'mix':
+        set_led_pattern(_leds[button.index], 'standby')
+
 
+# Function to re-enable all buttons
+def enable_buttons():
+    for btn in _buttons:
+        btn.when_pressed = execute_command
 
-def debounce_button(button, interval):
-    button.when_pressed = None  # Temporarily disable the button
-    sleep(interval)  # Wait for debounce interval
-    button.when_pressed = execute_command  # Re-enable the button
+
+# Function to re-enable a single button, unless replaced by a config reload
+def enable_button(button: Button):
+    if not button.closed:
+        button.when_pressed = execute_command
+
+
+# Function to play the soundFile of a button and control LEDs
+def play_button(button: Button, player, pressed: float = None):
+    """Play the soundFile of the button, blinking its LED. `pressed` is the
+    `perf_counter()` time of the press.
+    """
+    # From global
+    config = _config
+    leds = _leds
+    logger = _logger
+
+    # Get the button soundFile
+    entry = _catalog.get(button.index, button.pin.number)
+    soundfile = entry.path if entry else soundfile_path(button)
+    logger.info(f"Button {button.index} for {button.pin} playing {soundfile}")
+
+    # Blink the button's LED and, unless mixing, turn off all other LEDs
+    logger.debug("Blink activated LED and disable other LEDs")
+    with press_stage_seconds.labels(stage='led_setup').time():
+        for led in leds:
+            if led.index == button.index:
+                set_led_pattern(led, 'blink')
+            elif config['PRESS_POLICY'] != 'mix':
+                set_led_pattern(led, 'off')
+
+    # Play the soundFile
+    if pressed is not None:
+        logger.debug(f"Play soundFile, {1000 * (perf_counter() - pressed):.1f}ms after the press")
+    player.started = None
+    if entry is None and not os.path.isfile(soundfile):  # the catalog may lag behind a new file
+        logger.error(f"SoundFile {soundfile} not found.")
+        success = False
+    else:
+        success = player.play(soundfile)
+    if player.started is not None:
+        if pressed is not None:
+            press_stage_seconds.labels(stage='player_start').observe(player.started - pressed)
+        press_stage_seconds.labels(stage='playback').observe(perf_counter() - player.started)
+    if not success:
+        logger.error(f"Playback of {soundfile} failed")
+        playback_failures_total.labels(player=type(player).__name__).inc()
+        set_led_pattern(leds[button.index], 'error')
+        _scheduler.call_later(config['LED_ERROR_SECONDS'], reset_leds, button)
+
+    logger.info(f"Button {button.index} playing done.")
+    return success
 
 
 # Function to execute the command and control LEDs
 def execute_command(button: Button):
-    """Function handled when the GPIO pin is triggered."""
+    """Function handled when the GPIO pin is triggered. Applies the press
+    policy and returns the outcome of the press.
+    """
+    # From global
+    pressed = perf_counter()
+    pin = button.pin.number
+    config = _config
+    logger = _logger
 
-    if _execute_command_lock.locked():
-        _logger.warning("Command already running, ignoring this press.")
-        return
+    # Disable the button during the debounce period
+    button.when_pressed = None
+    _scheduler.call_later(config['BUTTON_DEBOUNCE_SECONDS'], enable_button, button)
 
     with _execute_command_lock:
+        press_stage_seconds.labels(stage='lock_wait').observe(perf_counter() - pressed)
+        policy = config['PRESS_POLICY']  # consistent with the voices while locked
+        voice = _voices[button.index if policy == 'mix' else 0]
+        if not voice.busy:
+            outcome = 'mixed' if any(v.busy for v in _voices) else 'played'
+            voice.submit(button, pressed)
+        elif policy == 'queue' and voice.pending <= config['PRESS_QUEUE_SIZE']:
+            outcome = 'queued'
+            voice.submit(button, pressed)
+        elif policy == 'preempt':
+            outcome = 'preempted'
+            voice.preempt(button, pressed)
+        else:
+            outcome = 'dropped'
+
+    if outcome == 'dropped':
+        logger.warning(f"Button {button.index} for {button.pin} pressed while busy, dropping this press.")
+    else:
+        logger.info(f"Button {button.index} for {button.pin} pressed, {outcome}.")
+
+    # Queue trigger for the database
+    logger.debug("Queue trigger for the database")
+    created = utcnow()
+    with press_stage_seconds.labels(stage='db_queue').time():
+        _writer.put(button=button.index, pin=pin, outcome=outcome, created=created)
+    presses_total.labels(outcome=outcome).inc()
+    if _ring is not None:
+        _ring.append(button.index, pin, outcome, created)
+
+    # Notify the event subscribers
+    _server.publish('trigger', dict(
+        button=button.index,
+        pin=pin,
+        name=button_pin(button.index, pin),
+        outcome=outcome,
+        created=dump_datetime(created),
+    ))
+
+    return outcome
+
+
+# Control socket commands
+def metrics_command() -> dict:
+    """Core telemetry in the Prometheus text format."""
+    return dict(metrics=registry.render())
+
+
+def press_command(button: int, pin: int = None) -> dict:
+    """Press a button like its GPIO pin does, returning the outcome. A button
+    within its debounce period is ignored with outcome `debounced`.
+    """
+    if not 0 <= button < len(_buttons):
+        raise ValueError(f"Unknown button {button}")
+    btn = _buttons[button]
+    if pin is not None and pin != btn.pin.number:
+        raise ValueError(f"Button {button} is not on GPIO{pin}")
+    if btn.when_pressed is None:
+        return dict(button=button, pin=btn.pin.number, outcome='debounced')
+    return dict(button=button, pin=btn.pin.number, outcome=execute_command(btn))
+
+
+def state_command() -> dict:
+    """Press policy, voice and button state of the core."""
+    return dict(
+        policy=_config['PRESS_POLICY'],
+        voices=[dict(index=i, busy=voice.busy, pending=voice.pending) for i, voice in enumerate(_voices)],
+        buttons=[dict(
+            index=btn.index,
+            pin=btn.pin.number,
+            enabled=btn.when_pressed is not None,
+            soundfile=_catalog.get(btn.index, btn.pin.number) is not None,
+        ) for btn in _buttons],
+    )
+
+
+def job_submit_command(name: str, **kwargs) -> dict:
+    """Submit a job by name, returning the (deduplicated) job."""
+    if name not in job_functions:
+        raise ValueError(f"Unknown job {name}")
+    return _jobs.submit(name, partial(job_functions[name], timeout=_config['JOB_TIMEOUT_SECONDS']), **kwargs).serialize
+
+
+def job_command(id: str) -> dict:
+    """State and output of a job, `{"job": None}` if unknown or expired."""
+    job = _jobs.get(id)
+    return dict(job=job.serialize if job else None)
+
+
+# Config reload
+player_config = ('SOUNDFILE_PLAYER', 'SOUNDFILE_FALLBACK_PLAYER', 'SOUNDFILE_DEVICE', 'SOUNDFILE_PERIODSIZE',
+                 'SOUNDFILE_OUTPUT_FORMAT', 'SOUNDFILE_RAW_FORMAT', 'SOUNDFILE_LOUDNESS', 'SOUNDFILE_PEAK',
+                 'SOUNDFILE_TRIM_SILENCE')
+restart_config = ('CORE_SOCKET', 'SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_ENGINE_OPTIONS', 'SQLITE_PRAGMAS',
+                  'SQLITE_POOL', 'SOUNDFILE_FOLDER', 'TRIGGER_BATCH_SIZE', 'TRIGGER_FLUSH_SECONDS',
+                  'TRIGGER_COMMIT_ATTEMPTS', 'TRIGGER_QUEUE_SIZE',
+                  'JOB_WORKERS', 'JOB_RETENTION_SECONDS', 'JOB_TIMEOUT_SECONDS',
+                  'EVENTS_KEEPALIVE_SECONDS', 'EVENTS_STATUS_SECONDS',
+                  'SYSTEMD_STATUS', 'RING_PATH', 'RING_SLOTS')
+_reload_lock = Lock()
+_reload_timer = None
+_watchers = []
+
+
+def changed_indices(old: list, new: list) -> list:
+    """Indices of the pins that differ between two pin lists."""
+    return [i for i in range(max(len(old), len(new))) if old[i:i + 1] != new[i:i + 1]]
+
+
+def reload_config():
+    """Reload the config files and apply the changes, rebuilding only the
+    buttons and LEDs of which the pin changed, and the player and voices if
+    their settings changed. The other pins keep being monitored. Changes to
+    `restart_config` are only applied by a restart.
+    """
+    global _player
+    logger = _logger
+    with _reload_lock:
+        try:
+            config = get_config()
+        except Exception as e:
+            logger.error(f"Cannot reload the config, keeping the current config: {e}")
+            return
+        if config['PRESS_POLICY'] not in press_policies:
+            logger.error(f"Invalid PRESS_POLICY {config['PRESS_POLICY']}, keeping the current config.")
+            return
+        pins = list(config['BUTTON_PINS']) + list(config['LED_PINS'])
+        if len(set(pins)) != len(pins):
+            logger.error("Duplicate pins in BUTTON_PINS and LED_PINS, keeping the current config.")
+            return
+
+        changed = {key for key in set(config) | set(_config) if config.get(key) != _config.get(key)}
+        skipped = sorted(changed & set(restart_config))
+        if skipped:
+            logger.warning(f"Restart pi3ctrl-core to apply the changed {', '.join(skipped)}.")
+            for key in skipped:
+                config[key] = _config[key]
+        changed -= set(skipped)
+        if not changed:
+            logger.info("Reloaded the config, nothing changed.")
+            return
+
+        buttons = changed_indices(_config['BUTTON_PINS'], config['BUTTON_PINS'])
+        leds = changed_indices(_config['LED_PINS'], config['LED_PINS'])
+
+        # Prepare the soundFiles, new player and voices while the current ones keep playing
+        paths = [_catalog.path(i, pin) for i, pin in enumerate(config['BUTTON_PINS'])]
+        prepare_soundfiles(paths, config)
+        n_voices = len(config['BUTTON_PINS']) if config['PRESS_POLICY'] == 'mix' else 1
+        voices = None
+        if changed & set(player_config) or n_voices != len(_voices):
+            player = get_player(config, logger=logger)
+            player.load(paths)
+            voices = create_voices(player, len(config['BUTTON_PINS']), config['PRESS_POLICY'])
+            for voice in voices:
+                voice.start()
+
+        # Swap the changed objects in between two presses
+        with _execute_command_lock:
+            for i in buttons:
+                if i < len(_buttons):
+                    _buttons[i].close()
+            for i in leds:
+                if i < len(_leds):
+                    _scheduler.cancel(_leds[i])
+                    _leds[i].close()
+            _buttons[:] = [IndexedButton(pin, index=i) if i in buttons else _buttons[i]
+                           for i, pin in enumerate(config['BUTTON_PINS'])]
+            _leds[:] = [IndexedLED(pin, index=i) if i in leds else _leds[i]
+                        for i, pin in enumerate(config['LED_PINS'])]
+            _config.update(config)
+            if voices is not None:
+                old_voices = list(_voices)
+                for voice in old_voices:
+                    voice.generation += 1  # discard the pending presses
+                    voice.pending = 0
+                _voices[:] = voices
+                _player = player
+
+        for i in buttons:
+            if i < len(_buttons):
+                enable_button(_buttons[i])
+        for i in leds:
+            if i < len(_leds):
+                set_led_pattern(_leds[i], 'standby')
+        if voices is not None:
+            for voice in old_voices:
+                voice.stop()
+                voice.player.close()
+        logger.setLevel(logging.DEBUG if config['DEBUG'] else logging.INFO)
+        logger.info(f"Reloaded the config: {', '.join(sorted(changed))} changed, "
+                    f"rebuilt buttons {buttons}, LEDs {leds}{' and the player' if voices else ''}.")
+
+
+def start_reload():
+    Thread(target=reload_config, name='pi3ctrl-reload', daemon=True).start()
+
+
+def schedule_reload(delay: float = .5):
+    """Reload the config after `delay` seconds without further requests."""
+    global _reload_timer
+    if _reload_timer is not None:
+        _reload_timer.cancel()
+    _reload_timer = _scheduler.call_later(delay, start_reload)
+
+
+def reload_handler(signal, frame):
+    _logger.info("Reloading the config...")
+    schedule_reload(0.)
+
+
+def watch_config():
+    """Reload the config when one of the config files is written."""
+    folders = dict()
+    for path in config_files():
+        folders.setdefault(os.path.dirname(os.path.abspath(path)), set()).add(os.path.basename(path))
+    for folder, names in folders.items():
+        if not os.path.isdir(folder):
+            continue
+        watcher = DirectoryWatcher(folder, lambda name, names=names: name in names and schedule_reload(), _logger)
+        try:
+            watcher.start()
+        except OSError as e:
+            _logger.warning(f"Cannot watch {folder} for config changes, reload with SIGHUP: {e}")
+            continue
+        _watchers.append(watcher)
 
-        # Disable all buttons immediately to prevent multiple triggers
-        for btn in _buttons:
-            btn.when_pressed = None
 
-        try:
-            # From global
-            config = _config
-            leds = _leds
-            logger = _logger
-
-            # Construct button command
-            command = "{player} {sf} -v".format(
-                player=config['SOUNDFILE_PLAYER'],
-                sf=os.path.expandvars(os.path.join(
-                    config['SOUNDFILE_FOLDER'],
-                    f"soundFile.{button.index}.{button.pin}"
-                ))
-            )
-            logger.info(f"Button {button.index} for {button.pin} pressed, executing command: {command}")
-
-            # Turn off all LEDs and blink the pressed button's LED
-            logger.debug("Blink activated LED and disable other LEDs")
-            stop_event = Event()
-            blink_thread = None
-            for i, led in enumerate(leds):
-                if i == button.index:
-                    led.off()
-                    blink_thread = Thread(target=blink_led, args=(leds[button.index], stop_event))
-                    blink_thread.start()
-                else:
-                    led.off()
-
-            # Add trigger to database
-            logger.debug("Add trigger to database")
-            with create_app().app_context() as ctx:
-                ctx.push()
-                new_trigger = Trigger(button=button.index, pin=button.pin.number)
-                db.session.add(new_trigger)
-                db.session.commit()
-
-            # Run the command
-            logger.debug("Execute command")
-            result = subprocess.run(command, shell=True, capture_output=True, text=True)
-            logger.debug(f"Command output: {result.stdout}")
-
-        finally:
-            # Stop blinking, reset LEDs, re-enable buttons with debounce
-            logger.debug("Reset LEDs")
-            if blink_thread is not None:
-                stop_event.set()
-                blink_thread.join()
-            set_leds_standby()
-
-            # Re-enable buttons with a debounce period
-            logger.debug("Re-enable buttons")
-            debounce_interval = 0.3  # 300ms debounce interval
-            for btn in _buttons:
-                Thread(target=debounce_button, args=(btn, debounce_interval)).start()
-
-        logger.info(f"Button {button.index} executing command done.")
+def prepare_soundfiles(paths: list, config=None):
+    """Prepare the playback-ready variants of the soundFiles, if outdated."""
+    settings = ingest_settings(config or _config)
+    for path in paths:
+        ensure_variant(path, settings, logger=_logger)
+
+
+def reload_soundfile(path: str):
+    prepare_soundfiles([path])
+    _player.reload(path)
 
 
 # Function to handle clean exit
 def exit_handler(signal, frame):
     _logger.info("Exiting script...")
+    for watcher in _watchers:
+        watcher.stop()
+    _monitor.stop()
+    _server.stop()
+    _jobs.shutdown()
+    for voice in _voices:
+        voice.stop()
+        voice.player.close()
+    _writer.stop()
+    if _ring is not None:
+        _ring.close()
+    _scheduler.stop()
+    _catalog.close()
     sys.exit(0)
 
 
@@ -166,13 +626,49 @@ def main():
     config = _config
     buttons = _buttons
     logger = _logger
+    catalog = _catalog
+    player = _player
+    writer = _writer
+    scheduler = _scheduler
+    voices = _voices
+    server = _server
+    monitor = _monitor
+
+    # Check the press policy
+    if config['PRESS_POLICY'] not in press_policies:
+        logger.error(f"Invalid PRESS_POLICY {config['PRESS_POLICY']}, should be one of {press_policies}.")
+        sys.exit(1)
+
+    # Start the database writer, the scheduler and the voices
+    writer.start()
+    scheduler.start()
+    for voice in voices:
+        voice.start()
+
+    # Serve the control socket and its events
+    server.commands.update(press=press_command, state=state_command, metrics=metrics_command,
+                           job_submit=job_submit_command, job=job_command)
+    server.snapshot = monitor.snapshot
+    server.start()
+    if is_RPi:
+        monitor.start()
+
+    # Index the soundFiles, preload them and open the output device
+    logger.info(f"Found {len(catalog.entries())} soundFiles in {catalog.folder}")
+    catalog.subscribe(reload_soundfile)
+    prepare_soundfiles([soundfile_path(button) for button in buttons])
+    player.load([soundfile_path(button) for button in buttons])
 
     # Attach the execute_command function to each button
-    for button in buttons:
-        button.when_pressed = execute_command
+    enable_buttons()
 
-    # Attach the exit handler to SIGINT (Ctrl+C)
+    # Attach the exit handler to SIGINT (Ctrl+C) and SIGTERM (systemd stop)
     signal.signal(signal.SIGINT, exit_handler)
+    signal.signal(signal.SIGTERM, exit_handler)
+
+    # Reload the config on SIGHUP (systemctl reload) and when a config file changes
+    signal.signal(signal.SIGHUP, reload_handler)
+    watch_config()
 
     # Set LEDs to standby mode initially
     set_leds_standby()
@@ -1,14 +1,79 @@
 # absolute imports
+from datetime import datetime, timedelta, timezone
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from logging import Logger
+from queue import Queue, Empty, Full
+from sqlalchemy import Integer, cast, event, func, insert, inspect, select, text, update
+from sqlalchemy.exc import OperationalError
+from threading import Thread
+from time import monotonic, sleep
 
+# Relative imports
+from .telemetry import registry
 
-__all__ = ['db', 'Trigger']
+
+__all__ = ['db', 'Trigger', 'TriggerCount', 'TriggerWriter', 'trigger_metrics',
+           'rebuild_trigger_counts', 'select_triggers', 'trigger_series', 'upgrade_schema',
+           'sqlite_engine_options', 'apply_sqlite_pragmas', 'write_with_retry']
 
 
 db = SQLAlchemy()
 
 
+def utcnow():
+    """Naive UTC timestamp, identical to the SQLite `CURRENT_TIMESTAMP`."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def is_sqlite_file(uri: str) -> bool:
+    """Return `True` for a file based SQLite database uri."""
+    return uri.startswith('sqlite') and ':memory:' not in uri and uri != 'sqlite://'
+
+
+def sqlite_engine_options(config, process: str) -> dict:
+    """Engine options of the SQLite connection pool of a process, `'http'` or
+    `'core'`, with the configured `SQLALCHEMY_ENGINE_OPTIONS` taking precedence.
+    """
+    options = dict(config['SQLALCHEMY_ENGINE_OPTIONS'])
+    if is_sqlite_file(config['SQLALCHEMY_DATABASE_URI']):
+        options = {**config['SQLITE_POOL'].get(process, dict()), **options}
+    return options
+
+
+def apply_sqlite_pragmas(engine, pragmas: dict):
+    """Apply the PRAGMAs to every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def is_busy_error(e: OperationalError) -> bool:
+    """Return `True` if the database was locked by another writer."""
+    return 'locked' in str(e.orig) or 'busy' in str(e.orig)
+
+
+def write_with_retry(write, retries: int = 5, backoff: float = .05):
+    """Call `write(session)` and commit, retrying with exponential backoff
+    while the database is locked by another writer. Requires an app context.
+    """
+    for attempt in range(retries + 1):
+        try:
+            write(db.session)
+            db.session.commit()
+            return
+        except OperationalError as e:
+            db.session.rollback()
+            if attempt == retries or not is_busy_error(e):
+                raise
+            sleep(backoff * 2 ** attempt)
+
+
 def dump_datetime(value):
     """Deserialize datetime object into string form for JSON processing."""
     if value is None:
@@ -18,13 +83,19 @@ def dump_datetime(value):
 
 # Define the Trigger class
 class Trigger(db.Model):
-    """Database table containing all GPIO trigger events, recording both the timestamp and pin."""
+    """Database table containing all GPIO trigger events, recording the timestamp, pin and the
+    outcome of the press (played, queued, preempted, mixed or dropped)."""
     __tablename__ = 'triggers'
+    __table_args__ = (
+        db.Index('ix_triggers_created', 'created'),
+        db.Index('ix_triggers_button_created', 'button', 'created'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     button = db.Column(db.Integer, nullable=False)
     pin = db.Column(db.Integer, nullable=False)
-    created = db.Column(db.TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+    created = db.Column(db.TIMESTAMP, nullable=False, default=utcnow, server_default=func.current_timestamp())
+    outcome = db.Column(db.String(10), nullable=False, default='played', server_default='played')
 
     @property
     def serialize(self):
@@ -33,5 +104,356 @@ class Trigger(db.Model):
             "id": self.id,
             "button": self.button,
             "pin": self.pin,
-            "created": dump_datetime(self.created)
+            "created": dump_datetime(self.created),
+            "outcome": self.outcome,
         }
+
+
+def select_triggers(since: datetime = None, until: datetime = None, buttons: list = None,
+                    after: int = None, limit: int = None):
+    """Select triggers ordered by id, filtered by creation time (since inclusive,
+    until exclusive) and buttons. `after` is the keyset cursor, the id of the
+    last trigger of the previous page.
+    """
+    stmt = select(Trigger).order_by(Trigger.id)
+    if since is not None:
+        stmt = stmt.where(Trigger.created >= since)
+    if until is not None:
+        stmt = stmt.where(Trigger.created < until)
+    if buttons:
+        stmt = stmt.where(Trigger.button.in_(buttons))
+    if after is not None:
+        stmt = stmt.where(Trigger.id > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def upgrade_schema():
+    """Add the columns and indexes missing from tables created by an earlier
+    version. Requires an app context.
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" NOT NULL DEFAULT '{column.server_default.arg}'"
+            with db.engine.begin() as connection:
+                connection.execute(text(ddl))
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(bind=db.engine)
+
+
+class TriggerCount(db.Model):
+    """Database table with the trigger counts per button and pin, rolled up by
+    date, weekday and hour. Updated on every trigger insert. `archived` is the
+    part of the count of which the triggers were moved to the archive.
+    """
+    __tablename__ = 'trigger_counts'
+
+    button = db.Column(db.Integer, primary_key=True)
+    pin = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(8), primary_key=True)
+    value = db.Column(db.String(10), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    archived = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+count_metrics = ('date', 'weekday', 'hour')
+
+
+def count_keys(created: datetime) -> dict:
+    """Rollup metric values of a trigger timestamp."""
+    return {
+        'date': created.strftime('%Y-%m-%d'),
+        'weekday': str(created.weekday()),  # 0=Monday, 6=Sunday
+        'hour': str(created.hour),
+    }
+
+
+def count_trigger(connection, button: int, pin: int, created: datetime, count: int = 1):
+    """Add a trigger to the rollup counts using the given connection."""
+    table = TriggerCount.__table__
+    for metric, value in count_keys(created).items():
+        key = dict(button=button, pin=pin, metric=metric, value=value)
+        result = connection.execute(
+            update(table)
+            .where(*[table.c[k] == v for k, v in key.items()])
+            .values(count=table.c.count + count)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(count=count, **key))
+
+
+@event.listens_for(Trigger, 'after_insert')
+def _count_inserted_trigger(mapper, connection, target):
+    count_trigger(connection, target.button, target.pin, target.created)
+
+
+def rebuild_trigger_counts(chunk_size: int = 1000) -> int:
+    """Rebuild the rollup counts from the triggers table and the archived
+    counts. Returns the number of triggers counted. Requires an app context.
+    """
+    table = TriggerCount.__table__
+    archived = {
+        (button, pin, metric, value): count
+        for button, pin, metric, value, count in db.session.execute(
+            select(table.c.button, table.c.pin, table.c.metric, table.c.value, table.c.archived)
+            .where(table.c.archived > 0)
+        )
+    }
+    counts = dict(archived)
+    n = 0
+    rows = db.session.execute(
+        select(Trigger.button, Trigger.pin, Trigger.created)
+        .execution_options(yield_per=chunk_size)
+    )
+    for button, pin, created in rows:
+        for metric, value in count_keys(created).items():
+            key = (button, pin, metric, value)
+            counts[key] = counts.get(key, 0) + 1
+        n += 1
+    db.session.execute(table.delete())
+    if counts:
+        db.session.execute(insert(table), [
+            dict(button=button, pin=pin, metric=metric, value=value, count=count,
+                 archived=archived.get((button, pin, metric, value), 0))
+            for (button, pin, metric, value), count in counts.items()
+        ])
+    db.session.commit()
+    return n
+
+
+def button_pin(button: int, pin: int) -> str:
+    """Button and pin label used in the metrics."""
+    return f"button {button} | GPIO{pin}"
+
+
+def trigger_metrics() -> dict:
+    """Get the last trigger and the trigger counts per button and pin, in
+    total and by date, weekday and hour. The counts include the archived
+    triggers, `last` is empty if the triggers table is. Requires an app
+    context.
+    """
+    last = db.session.execute(
+        select(Trigger.button, Trigger.pin, Trigger.created).order_by(Trigger.id.desc()).limit(1)
+    ).first()
+
+    metrics = dict(last={button_pin(last.button, last.pin): dump_datetime(last.created)} if last else {},
+                   total=dict())
+    for metric in count_metrics:
+        metrics[metric] = dict()
+
+    rows = db.session.execute(
+        select(TriggerCount.button, TriggerCount.pin, TriggerCount.metric, TriggerCount.value,
+               TriggerCount.count)
+    ).all()
+    rows = sorted(
+        (button_pin(r.button, r.pin), r.metric, r.value if r.metric == 'date' else int(r.value), r.count)
+        for r in rows
+    )
+
+    for bp, metric, value, count in rows:
+        metrics[metric].setdefault(bp, dict())[value] = count
+        if metric == 'hour':
+            metrics['total'][bp] = metrics['total'].get(bp, 0) + count
+
+    return metrics
+
+
+# Time series buckets: start of the bucket as SQLite strftime format, bucket
+# length and default window
+metric_buckets = {
+    'minute': ('%Y-%m-%d %H:%M:00', timedelta(minutes=1), timedelta(days=1)),
+    'hour': ('%Y-%m-%d %H:00:00', timedelta(hours=1), timedelta(days=7)),
+    'day': ('%Y-%m-%d', timedelta(days=1), timedelta(days=365)),
+    'week': (None, timedelta(weeks=1), timedelta(weeks=260)),
+}
+
+weekdays = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+def bucket_start(bucket: str):
+    """SQL expression of the start of the bucket of a trigger."""
+    if bucket == 'week':
+        return func.date(Trigger.created, 'weekday 0', '-6 days')  # Monday
+    return func.strftime(metric_buckets[bucket][0], Trigger.created)
+
+
+def _grouped_series(stmt, names: list = None) -> list:
+    """Highcharts series from `(button, pin, x, count)` rows ordered by button
+    and pin, as `[x, count]` pairs or, with `names`, as counts per name.
+    """
+    series = dict()
+    for button, pin, x, count in db.session.execute(stmt):
+        data = series.setdefault(button_pin(button, pin), [0] * len(names) if names else [])
+        if names:
+            data[int(x)] += count
+        else:
+            data.append([x, count])
+    return [dict(name=name, data=data) for name, data in series.items()]
+
+
+def trigger_series(since: datetime, until: datetime, bucket: str = 'day', buttons: list = None) -> dict:
+    """Trigger counts per button and pin within `[since, until)` as Highcharts
+    series: a time series in buckets of a `minute`, `hour`, `day` or `week`,
+    and the profiles by weekday and hour. The counts are grouped in SQLite
+    using the created index. Archived triggers are not included. Requires an
+    app context.
+    """
+    where = [Trigger.created >= since, Trigger.created < until]
+    if buttons:
+        where.append(Trigger.button.in_(buttons))
+
+    def grouped(x):
+        return (
+            select(Trigger.button, Trigger.pin, x, func.count())
+            .where(*where)
+            .group_by(Trigger.button, Trigger.pin, x)
+            .order_by(Trigger.button, Trigger.pin, x)
+        )
+
+    timestamp = cast(func.strftime('%s', bucket_start(bucket)), Integer) * 1000  # epoch ms
+    weekday = (cast(func.strftime('%w', Trigger.created), Integer) + 6) % 7  # Monday=0
+    hour = cast(func.strftime('%H', Trigger.created), Integer)
+
+    last = db.session.execute(
+        select(Trigger.button, Trigger.pin, Trigger.created).where(*where).order_by(Trigger.created.desc()).limit(1)
+    ).first()
+    hours = _grouped_series(grouped(hour), range(24))
+
+    return {
+        'from': dump_datetime(since),
+        'to': dump_datetime(until),
+        'bucket': bucket,
+        'last': {button_pin(last.button, last.pin): dump_datetime(last.created)} if last else {},
+        'total': {s['name']: sum(s['data']) for s in hours},
+        'series': _grouped_series(grouped(timestamp)),
+        'weekday': dict(categories=list(weekdays), series=_grouped_series(grouped(weekday), weekdays)),
+        'hour': dict(categories=list(range(24)), series=hours),
+    }
+
+
+db_commit_seconds = registry.histogram(
+    'pi3ctrl_db_commit_seconds', 'Duration of trigger batch commits to the database.'
+)
+db_commit_errors = registry.counter(
+    'pi3ctrl_db_commit_errors_total', 'Number of failed trigger batch commits.'
+)
+triggers_dropped = registry.counter(
+    'pi3ctrl_triggers_dropped_total', 'Number of triggers dropped by a full queue or failing commits.'
+)
+
+
+class TriggerWriter(Thread):
+    """Write-behind queue committing triggers to the database in batches from
+    a background thread, keeping the database write off the press path.
+
+    A batch is committed once it holds `batch_size` triggers or its oldest
+    trigger waited `flush_seconds`. A failed batch is retried with backoff;
+    after `attempts` failures its triggers are committed one by one and the
+    ones that still fail are dropped. Triggers queued beyond `queue_size` are
+    dropped as well.
+    """
+    _stop_sentinel = None
+
+    def __init__(self, app, batch_size: int = 50, flush_seconds: float = 1., attempts: int = 5,
+                 queue_size: int = 10000, logger: Logger = None):
+        super().__init__(name='pi3ctrl-trigger-writer', daemon=True)
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.attempts = attempts
+        self.logger = logger
+        self.queue = Queue(maxsize=queue_size)
+        self._pending = []
+        self._failures = 0
+
+    def _log(self, level: str, msg: str):
+        if isinstance(self.logger, Logger):
+            getattr(self.logger, level)(msg)
+
+    def put(self, button: int, pin: int, outcome: str = 'played', created: datetime = None):
+        """Queue a trigger, timestamped now unless `created` is given. Never
+        blocks: the trigger is dropped if the queue is full.
+        """
+        item = dict(button=button, pin=pin, outcome=outcome, created=created or utcnow())
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            triggers_dropped.inc()
+            self._log('error', f"Trigger queue full, dropping {item}")
+
+    def _collect(self) -> bool:
+        """Move queued triggers to the pending batch until it is full or the
+        flush deadline of its oldest trigger passed. Returns `False` on stop.
+        """
+        deadline = monotonic() + self.flush_seconds if self._pending else None
+        while len(self._pending) < self.batch_size:
+            try:
+                item = self.queue.get(timeout=None if deadline is None else max(0., deadline - monotonic()))
+            except Empty:
+                return True
+            if item is self._stop_sentinel:
+                return False
+            self._pending.append(item)
+            if deadline is None:
+                deadline = monotonic() + self.flush_seconds
+        return True
+
+    def _commit_each(self):
+        """Commit the pending triggers one by one, dropping the failing ones."""
+        for item in self._pending:
+            try:
+                db.session.add(Trigger(**item))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                triggers_dropped.inc()
+                self._log('error', f"Dropping trigger {item}: {e}")
+
+    def _commit(self):
+        """Commit all pending triggers in a single transaction."""
+        if not self._pending:
+            return
+        with self.app.app_context():
+            try:
+                with db_commit_seconds.time():
+                    db.session.add_all([Trigger(**item) for item in self._pending])
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                db_commit_errors.inc()
+                self._failures += 1
+                self._log('error', f"Failed to commit {len(self._pending)} triggers "
+                                   f"({self._failures}/{self.attempts}): {e}")
+                if self._failures < self.attempts:
+                    sleep(min(self.flush_seconds * 2 ** (self._failures - 1), 30.))
+                    return
+                self._commit_each()
+            else:
+                self._log('debug', f"Committed {len(self._pending)} triggers to the database")
+        self._pending = []
+        self._failures = 0
+
+    def run(self):
+        running = True
+        while running:
+            running = self._collect()
+            self._commit()
+        while self._pending:  # retry a failed last batch until committed or dropped
+            self._commit()
+
+    def stop(self, timeout: float = None):
+        """Flush all queued triggers and stop the writer thread."""
+        self.queue.put(self._stop_sentinel)
+        if self.is_alive():
+            self.join(timeout)
+        else:
+            self.run()
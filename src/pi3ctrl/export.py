@@ -0,0 +1,130 @@
+# Absolute imports
+import csv
+import io
+import json
+import zlib
+
+# Optional imports
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Relative imports
+from .database import db, Trigger, dump_datetime
+
+
+__all__ = ['export_formats', 'export_triggers']
+
+
+export_columns = ('id', 'button', 'pin', 'created', 'outcome')
+
+
+# Export format: (mimetype, file extension)
+export_formats = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+if pyarrow is not None:
+    export_formats['parquet'] = ('application/vnd.apache.parquet', 'parquet')
+
+
+def trigger_chunks(stmt, chunk_size: int = 500):
+    """Rows of a trigger select in chunks of `chunk_size`, fetched with a
+    server-side cursor. Requires an app context.
+    """
+    stmt = stmt.with_only_columns(*[Trigger.__table__.c[column] for column in export_columns])
+    result = db.session.execute(stmt.execution_options(yield_per=chunk_size))
+    yield from result.partitions()
+
+
+def csv_chunks(chunks):
+    f = io.StringIO()
+    writer = csv.writer(f)
+    writer.writerow(export_columns)
+    for rows in chunks:
+        writer.writerows((id, button, pin, dump_datetime(created), outcome)
+                         for id, button, pin, created, outcome in rows)
+        yield f.getvalue().encode()
+        f.seek(0)
+        f.truncate()
+    if f.tell():
+        yield f.getvalue().encode()
+
+
+def ndjson_chunks(chunks):
+    for rows in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(export_columns, (id, button, pin, dump_datetime(created), outcome)))) + '\n'
+            for id, button, pin, created, outcome in rows
+        ).encode()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file collecting the bytes written since the last `take()`."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def parquet_chunks(chunks):
+    """One parquet row group per chunk, the file footer last."""
+    schema = pyarrow.schema([
+        ('id', pyarrow.int64()),
+        ('button', pyarrow.int32()),
+        ('pin', pyarrow.int32()),
+        ('created', pyarrow.timestamp('s')),
+        ('outcome', pyarrow.string()),
+    ])
+    sink = _Sink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    for rows in chunks:
+        writer.write_table(pyarrow.Table.from_pylist([dict(zip(export_columns, row)) for row in rows], schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """Compress a stream of bytes chunks into a single gzip stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_triggers(stmt, format: str = 'csv', compress: bool = True, chunk_size: int = 500):
+    """Stream the triggers of a select as csv, ndjson or parquet bytes chunks,
+    gzip compressed for csv and ndjson if `compress`. Memory use is bounded by
+    the `chunk_size`. Requires an app context for the whole stream.
+
+    Resume an interrupted export by selecting the triggers after the last id
+    received.
+    """
+    if format not in export_formats:
+        raise ValueError(f"Unsupported export format {format!r}")
+    chunks = trigger_chunks(stmt, chunk_size)
+    if format == 'parquet':
+        return parquet_chunks(chunks)
+    stream = csv_chunks(chunks) if format == 'csv' else ndjson_chunks(chunks)
+    return gzip_chunks(stream) if compress else stream
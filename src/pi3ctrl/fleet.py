@@ -0,0 +1,259 @@
+# Absolute imports
+from concurrent.futures import ThreadPoolExecutor, wait
+from logging import Logger
+from requests.adapters import HTTPAdapter
+from sqlalchemy import (Column, Index, Integer, MetaData, String, Table, Text, TIMESTAMP,
+                        create_engine, func, select, update)
+from sqlalchemy.dialects.sqlite import insert
+from threading import Event, Lock
+from time import monotonic
+import argparse
+import json
+import requests
+import signal
+
+# Relative imports
+from .config import get_config
+from .database import apply_sqlite_pragmas, utcnow
+from .utils import get_logger, parse_datetime
+
+
+__all__ = ['FleetPoller', 'FleetUnit', 'fleet_triggers', 'fleet_units']
+
+
+# Merged store of the polled units
+metadata = MetaData()
+
+fleet_units = Table(
+    'fleet_units', metadata,
+    Column('unit', String(64), primary_key=True),
+    Column('url', Text, nullable=False),
+    Column('cursor', Integer, nullable=False, default=0),  # id of the last trigger fetched
+    Column('metrics', Text),  # json of /_metrics
+    Column('status', Text),  # json of /_systemd_status
+    Column('last_seen', TIMESTAMP),
+    Column('last_error', Text),
+    Column('failures', Integer, nullable=False, default=0),
+)
+
+fleet_triggers = Table(
+    'fleet_triggers', metadata,
+    Column('unit', String(64), primary_key=True),
+    Column('id', Integer, primary_key=True),
+    Column('button', Integer, nullable=False),
+    Column('pin', Integer, nullable=False),
+    Column('created', TIMESTAMP, nullable=False),
+    Column('outcome', String(10), nullable=False),
+    Index('ix_fleet_triggers_created', 'created'),
+)
+
+
+class FleetUnit(object):
+    """A polled Pi3Ctrl unit with its own keep-alive session and backoff."""
+
+    def __init__(self, name: str, url: str, cursor: int = 0):
+        self.name = name
+        self.url = url.rstrip('/')
+        self.cursor = cursor
+        self.failures = 0
+        self.next_poll = 0.  # monotonic time
+        self.polling = False
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+    def get(self, path: str, timeout, **params) -> requests.Response:
+        resp = self.session.get(f"{self.url}{path}", params=params, timeout=timeout)
+        resp.raise_for_status()
+        return resp
+
+
+class FleetPoller(object):
+    """Poll a fleet of Pi3Ctrl units concurrently into a merged SQLite store.
+
+    Every unit is polled on its own schedule: only the triggers after its
+    cursor are fetched, and a failing or slow unit backs off exponentially
+    up to `max_backoff` seconds without delaying the others.
+    """
+
+    def __init__(self, units: dict, database_uri: str, interval: float = 60., timeout=(3.05, 10.),
+                 workers: int = 8, max_backoff: float = 900., page_size: int = 1000, max_pages: int = 50,
+                 pragmas: dict = None, logger: Logger = None):
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.logger = logger
+        self.engine = create_engine(database_uri)
+        if pragmas:
+            apply_sqlite_pragmas(self.engine, pragmas)
+        metadata.create_all(self.engine)
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pi3ctrl-fleet')
+
+        with self.engine.begin() as connection:
+            cursors = dict(connection.execute(select(fleet_units.c.unit, fleet_units.c.cursor)).all())
+            for name, url in units.items():
+                if name not in cursors:
+                    connection.execute(insert(fleet_units).values(unit=name, url=url, cursor=0, failures=0))
+                else:
+                    connection.execute(update(fleet_units).where(fleet_units.c.unit == name).values(url=url))
+        self.units = {name: FleetUnit(name, url, cursors.get(name, 0)) for name, url in units.items()}
+
+    def _log(self, level: str, msg: str):
+        if isinstance(self.logger, Logger):
+            getattr(self.logger, level)(msg)
+
+    def _store(self, unit: FleetUnit, triggers: list = None, **values):
+        """Store fetched triggers and unit state in one transaction."""
+        with self._lock, self.engine.begin() as connection:
+            if triggers:
+                connection.execute(insert(fleet_triggers).on_conflict_do_nothing(), [
+                    dict(unit=unit.name, id=t['id'], button=t['button'], pin=t['pin'],
+                         created=parse_datetime(t['created']), outcome=t.get('outcome', 'played'))
+                    for t in triggers
+                ])
+            connection.execute(update(fleet_units).where(fleet_units.c.unit == unit.name).values(**values))
+
+    def poll_unit(self, unit: FleetUnit) -> int:
+        """Fetch the metrics, service status and new triggers of a unit.
+        Returns the number of new triggers, or -1 on failure.
+        """
+        try:
+            metrics = unit.get('/_metrics', self.timeout).json()
+            try:
+                status = unit.get('/_systemd_status', self.timeout).json()
+            except requests.HTTPError:
+                status = None  # not a Raspberry Pi
+
+            # Page through the triggers after the cursor, committing every page
+            new = 0
+            for _ in range(self.max_pages):
+                resp = unit.get('/_triggers', self.timeout, after=unit.cursor, limit=self.page_size)
+                triggers = resp.json()
+                if triggers:
+                    self._store(unit, triggers, cursor=triggers[-1]['id'])
+                    unit.cursor = triggers[-1]['id']
+                    new += len(triggers)
+                if 'next' not in resp.links:
+                    break
+
+            unit.failures = 0
+            unit.next_poll = monotonic() + self.interval
+            self._store(unit, metrics=json.dumps(metrics), status=json.dumps(status),
+                        last_seen=utcnow(), last_error=None, failures=0)
+            self._log('debug', f"Polled {unit.name}: {new} new triggers")
+            return new
+
+        except (requests.RequestException, ValueError, KeyError) as e:
+            unit.failures += 1
+            delay = min(self.interval * 2 ** (unit.failures - 1), self.max_backoff)
+            unit.next_poll = monotonic() + delay
+            self._store(unit, last_error=str(e), failures=unit.failures)
+            self._log('warning', f"Polling {unit.name} failed ({unit.failures}x), retry in {delay:.0f}s: {e}")
+            return -1
+
+    def _poll(self, unit: FleetUnit) -> int:
+        try:
+            return self.poll_unit(unit)
+        finally:
+            unit.polling = False
+
+    def poll_due(self) -> dict:
+        """Start polling the units that are due and not being polled. Returns
+        the unit names by future.
+        """
+        now = monotonic()
+        futures = dict()
+        for unit in self.units.values():
+            if not unit.polling and unit.next_poll <= now:
+                unit.polling = True
+                futures[self._executor.submit(self._poll, unit)] = unit.name
+        return futures
+
+    def poll_all(self, timeout: float = None) -> dict:
+        """Poll all units once concurrently, ignoring the backoff. Returns the
+        new trigger counts by unit, -1 if failed and `None` if not finished
+        within `timeout` seconds.
+        """
+        for unit in self.units.values():
+            unit.next_poll = 0.
+        futures = self.poll_due()
+        done, _ = wait(futures, timeout=timeout)
+        return {name: future.result() if future in done else None for future, name in futures.items()}
+
+    def run(self, stop: Event, tick: float = 1.):
+        """Poll the due units every `tick` seconds until `stop` is set."""
+        while not stop.is_set():
+            self.poll_due()
+            stop.wait(tick)
+
+    def summary(self) -> dict:
+        """Merged state of the fleet by unit, for a combined dashboard."""
+        with self.engine.connect() as connection:
+            counts = dict(connection.execute(
+                select(fleet_triggers.c.unit, func.count()).group_by(fleet_triggers.c.unit)
+            ).all())
+            return {
+                row.unit: dict(
+                    url=row.url,
+                    triggers=counts.get(row.unit, 0),
+                    cursor=row.cursor,
+                    last_seen=row.last_seen.strftime('%Y-%m-%d %H:%M:%S') if row.last_seen else None,
+                    failures=row.failures,
+                    last_error=row.last_error,
+                    metrics=json.loads(row.metrics) if row.metrics else None,
+                    status=json.loads(row.status) if row.status else None,
+                )
+                for row in connection.execute(select(fleet_units).order_by(fleet_units.c.unit))
+            }
+
+    def close(self):
+        """Stop the workers and close the sessions and the store."""
+        self._executor.shutdown(wait=True)
+        for unit in self.units.values():
+            unit.session.close()
+        self.engine.dispose()
+
+
+def main():
+    """Poll the configured fleet of Pi3Ctrl units into a merged store."""
+    parser = argparse.ArgumentParser(
+        prog='pi3ctrl-fleet',
+        description='Poll the Pi3Ctrl units of FLEET_UNITS concurrently into a merged local store.',
+    )
+    parser.add_argument('command', choices=('run', 'poll', 'summary'), nargs='?', default='run',
+                        help='Poll continuously (default), poll once or print the merged summary.')
+    args = parser.parse_args()
+
+    config = get_config()
+    logger = get_logger('pi3ctrl-fleet', debug=config['DEBUG'])
+    poller = FleetPoller(
+        config['FLEET_UNITS'],
+        config['FLEET_DATABASE_URI'],
+        interval=config['FLEET_INTERVAL'],
+        timeout=config['FLEET_TIMEOUT'],
+        workers=config['FLEET_WORKERS'],
+        max_backoff=config['FLEET_MAX_BACKOFF'],
+        page_size=config['TRIGGER_PAGE_SIZE'],
+        pragmas=config['SQLITE_PRAGMAS'],
+        logger=logger,
+    )
+    try:
+        if args.command == 'summary':
+            print(json.dumps(poller.summary(), indent=2))
+        elif args.command == 'poll':
+            print(json.dumps(poller.poll_all(), indent=2))
+        else:
+            stop = Event()
+            signal.signal(signal.SIGINT, lambda *_: stop.set())
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            logger.info(f"Polling {len(poller.units)} units every {config['FLEET_INTERVAL']}s")
+            poller.run(stop)
+    finally:
+        poller.close()
+
+
+if __name__ == '__main__':
+    main()
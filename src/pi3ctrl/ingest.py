@@ -0,0 +1,284 @@
+# Absolute imports
+from logging import Logger
+import hashlib
+import json
+import numpy as np
+import os
+import wave
+
+# Relative imports
+from .soundfiles import file_sha256, read_meta, read_variant, remove_variant, variant_path, wav_info
+
+
+__all__ = ['ingest_settings', 'prepare_variant', 'ensure_variant']
+
+
+# Frames per processing chunk, bounding the memory use for long soundFiles
+chunk_frames = 64 * 1024
+
+
+def ingest_settings(config) -> dict:
+    """The settings of the playback-ready variants from the config."""
+    return dict(
+        output=list(config['SOUNDFILE_OUTPUT_FORMAT']),
+        raw=list(config['SOUNDFILE_RAW_FORMAT']),
+        loudness=config['SOUNDFILE_LOUDNESS'],
+        peak=config['SOUNDFILE_PEAK'],
+        trim=config['SOUNDFILE_TRIM_SILENCE'],
+    )
+
+
+def variant_key(sha256: str, settings: dict) -> str:
+    return hashlib.sha256(json.dumps([sha256, settings], sort_keys=True).encode()).hexdigest()
+
+
+def db(value: float) -> float:
+    """Linear amplitude of a level in dBFS."""
+    return 10 ** (value / 20)
+
+
+class Source(object):
+    """Sample reader of a WAV or raw PCM file, yielding float32 chunks of
+    shape (frames, channels) in [-1, 1).
+    """
+
+    def __init__(self, path: str, raw_format: tuple = None):
+        self.path = path
+        if raw_format is None:
+            with wave.open(path, 'rb') as w:
+                self.channels, self.sampwidth, self.rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        else:
+            self.channels, self.sampwidth, self.rate = raw_format
+        self.raw = raw_format is not None
+        if self.sampwidth not in (1, 2, 3, 4):
+            raise ValueError(f"Unsupported sample width {self.sampwidth}")
+
+    def chunks(self, start: int = 0):
+        frame = self.channels * self.sampwidth
+        if self.raw:
+            with open(self.path, 'rb') as f:
+                f.seek(start * frame)
+                while True:
+                    data = f.read(chunk_frames * frame)
+                    data = data[:len(data) - len(data) % frame]
+                    if not data:
+                        return
+                    yield decode(data, self.channels, self.sampwidth)
+        else:
+            with wave.open(self.path, 'rb') as w:
+                w.setpos(start)
+                while True:
+                    data = w.readframes(chunk_frames)
+                    if not data:
+                        return
+                    yield decode(data, self.channels, self.sampwidth)
+
+
+def decode(data: bytes, channels: int, sampwidth: int) -> np.ndarray:
+    """PCM bytes, unsigned 8 bit or signed little-endian, to float32 samples."""
+    if sampwidth == 1:
+        x = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sampwidth == 2:
+        x = np.frombuffer(data, dtype='<i2').astype(np.float32) / 2 ** 15
+    elif sampwidth == 3:
+        b = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        x = ((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) ^ 0x800000) - 0x800000
+        x = x.astype(np.float32) / 2 ** 23
+    else:
+        x = np.frombuffer(data, dtype='<i4').astype(np.float32) / 2 ** 31
+    return x.reshape(-1, channels)
+
+
+def encode(x: np.ndarray, sampwidth: int) -> bytes:
+    """Float samples to PCM bytes, unsigned 8 bit or signed little-endian."""
+    x = np.clip(x.reshape(-1), -1, 1)
+    if sampwidth == 1:
+        return (np.round(x * 127) + 128).astype(np.uint8).tobytes()
+    if sampwidth == 2:
+        return np.round(x * (2 ** 15 - 1)).astype('<i2').tobytes()
+    if sampwidth == 3:
+        y = np.round(x * (2 ** 23 - 1)).astype('<i4')
+        return y.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    return np.round(x.astype(np.float64) * (2 ** 31 - 1)).astype('<i4').tobytes()
+
+
+def remix(x: np.ndarray, channels: int) -> np.ndarray:
+    """Mix samples to a number of channels: mono is duplicated, downmixing to
+    mono averages and other layouts keep the first channels.
+    """
+    if x.shape[1] == channels:
+        return x
+    if x.shape[1] == 1:
+        return np.repeat(x, channels, axis=1)
+    if channels == 1:
+        return x.mean(axis=1, keepdims=True)
+    if x.shape[1] > channels:
+        return x[:, :channels]
+    return np.concatenate([x, np.repeat(x[:, -1:], channels - x.shape[1], axis=1)], axis=1)
+
+
+class LowPass(object):
+    """Streaming windowed-sinc FIR low-pass filter, compensating its delay.
+    The `cutoff` frequency is relative to the sample rate.
+    """
+
+    def __init__(self, cutoff: float, taps: int = 127):
+        n = np.arange(taps) - (taps - 1) / 2
+        h = np.sinc(2 * cutoff * n) * np.blackman(taps)
+        self.h = (h / h.sum()).astype(np.float32)
+        self.delay = (taps - 1) // 2
+        self.skip = self.delay  # output frames still ahead of the input
+        self.history = None  # last taps - 1 input frames
+
+    def __call__(self, x: np.ndarray, last: bool = False) -> np.ndarray:
+        if self.history is None:
+            self.history = np.zeros((len(self.h) - 1, x.shape[1]), dtype=np.float32)
+        if last:
+            x = np.concatenate([x, np.zeros((self.delay, x.shape[1]), dtype=np.float32)])
+        x = np.concatenate([self.history, x])
+        y = np.stack([np.convolve(x[:, c], self.h, mode='valid') for c in range(x.shape[1])], axis=1)
+        self.history = x[len(x) - len(self.history):]
+        skip = min(self.skip, len(y))
+        self.skip -= skip
+        return y[skip:]
+
+
+class Resampler(object):
+    """Streaming linear interpolation resampler. Downsampling is low-pass
+    filtered below the output Nyquist frequency first, against aliasing.
+    """
+
+    def __init__(self, rate_in: int, rate_out: int):
+        self.rate_in, self.rate_out = rate_in, rate_out
+        self.step = rate_in / rate_out
+        self.count = 0  # output frames so far, at input position count * step
+        self.offset = 0  # input position of the first buffered frame
+        self.previous = None  # last input frame of the previous chunk
+        self.lowpass = LowPass(.45 / self.step) if self.step > 1 else None
+
+    def __call__(self, x: np.ndarray, last: bool = False) -> np.ndarray:
+        if self.step == 1:
+            return x
+        if self.lowpass is not None:
+            x = self.lowpass(x, last)
+        if self.previous is not None:
+            x = np.concatenate([self.previous, x])
+            self.offset -= 1
+        if len(x) == 0:
+            return x
+        # the output frames before the end, in integers against rounding drift
+        end = self.offset + len(x) - (0 if last else 1)  # interpolate up to the last frame
+        n = max(0, -(-end * self.rate_out // self.rate_in) - self.count)
+        positions = (self.count + np.arange(n)) * self.step - self.offset
+        index = np.minimum(positions.astype(np.int64), len(x) - 1)
+        frac = (positions - index)[:, None].astype(np.float32)
+        after = x[np.minimum(index + 1, len(x) - 1)]
+        y = x[index] * (1 - frac) + after * frac
+        self.count += n
+        self.offset += len(x)
+        self.previous = x[-1:]
+        return y
+
+
+def analyze(source: Source, threshold: float = None) -> tuple:
+    """First frame above the `threshold` level (linear), the RMS and the peak
+    of the samples from there on.
+    """
+    start, frames, squares, peak = None, 0, 0., 0.
+    position = 0
+    for x in source.chunks():
+        if start is None:
+            loud = np.flatnonzero(np.abs(x).max(axis=1) > threshold) if threshold else np.arange(min(len(x), 1))
+            if len(loud) == 0:
+                position += len(x)
+                continue
+            start = position + loud[0]
+            x = x[loud[0]:]
+        frames += len(x)
+        squares += float(np.square(x, dtype=np.float64).sum()) / x.shape[1]
+        peak = max(peak, float(np.abs(x).max()))
+        position += len(x)
+    rms = (squares / frames) ** .5 if frames else 0.
+    return start or 0, rms, peak
+
+
+def prepare_variant(source: str, path: str, settings: dict, sha256: str, raw: bool = False) -> dict:
+    """Decode `source`, trim its leading silence, normalize its loudness and
+    convert it to the output format, writing it as the playback-ready variant
+    of the soundFile `path`. Returns the description of the variant.
+
+    Raises `ValueError` if the source cannot be decoded.
+    """
+    try:
+        reader = Source(source, tuple(settings['raw']) if raw else None)
+        trim = db(settings['trim']) if settings['trim'] is not None else None
+        start, rms, peak = analyze(reader, trim)
+    except (wave.Error, EOFError) as e:
+        raise ValueError(str(e))
+
+    # Gain to the target loudness, limited by the peak
+    gain = 1.
+    if settings['loudness'] is not None and rms > 0:
+        gain = min(db(settings['loudness']) / rms, db(settings['peak']) / peak)
+
+    # Convert and write the variant, atomically replacing the previous one
+    channels, sampwidth, rate = settings['output']
+    resample = Resampler(reader.rate, rate)
+    variant = variant_path(path)
+    tmp = f"{variant}.tmp"
+    with wave.open(tmp, 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sampwidth)
+        w.setframerate(rate)
+        for x in reader.chunks(start):
+            w.writeframes(encode(resample(remix(x, channels)) * gain, sampwidth))
+        w.writeframes(encode(resample(np.zeros((0, channels), dtype=np.float32), last=True) * gain, sampwidth))
+        nframes = w.getnframes()
+
+    info = dict(
+        key=variant_key(sha256, settings),
+        source_sha256=sha256,
+        channels=channels,
+        sampwidth=sampwidth,
+        rate=rate,
+        nframes=nframes,
+        duration=nframes / rate,
+        trimmed=float(start / reader.rate),
+        gain=round(float(20 * np.log10(gain)), 2) if gain > 0 else None,
+    )
+    with open(f"{tmp}.json", 'w') as f:
+        json.dump(info, f)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, variant)
+    os.replace(f"{tmp}.json", f"{variant}.json")
+    return info
+
+
+def ensure_variant(path: str, settings: dict, logger: Logger = None) -> dict:
+    """Prepare the variant of a soundFile unless it is up to date, removing
+    the variant of a removed soundFile. Returns the description of the
+    variant, or `None` if there is none.
+    """
+    if not os.path.isfile(path):
+        remove_variant(path)
+        return None
+    meta = read_meta(path)
+    if meta is not None and meta.get('size') == os.path.getsize(path):
+        sha256, raw = meta['sha256'], meta.get('wav') is None
+    else:
+        sha256, raw = file_sha256(path), wav_info(path) is None
+    current = read_variant(path)
+    if current is not None and current.get('key') == variant_key(sha256, settings) \
+            and os.path.isfile(variant_path(path)):
+        return current
+    try:
+        info = prepare_variant(path, path, settings, sha256, raw)
+    except (ValueError, OSError) as e:
+        if isinstance(logger, Logger):
+            logger.error(f"Cannot prepare {path} for playback: {e}")
+        remove_variant(path)
+        return None
+    if isinstance(logger, Logger):
+        logger.info(f"Prepared {variant_path(path)}: {info['channels']}ch {info['rate']}Hz "
+                    f"{8 * info['sampwidth']}bit {info['duration']:.2f}s")
+    return info
@@ -0,0 +1,112 @@
+# Absolute imports
+from logging import Logger
+from threading import Thread
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+
+
+__all__ = ['DirectoryWatcher', 'inotify_available']
+
+
+# inotify event masks, see inotify(7)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_CLOEXEC = 0o2000000
+
+_event = struct.Struct('iIII')
+
+_libc = None
+if os.name == 'posix':
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    except OSError:
+        pass
+inotify_available = _libc is not None and hasattr(_libc, 'inotify_init1')
+
+
+class DirectoryWatcher(Thread):
+    """Watch a directory with inotify and call `callback(name)` for every file
+    in it that is created, written, moved or removed.
+
+    `start()` raises `OSError` if inotify is not available.
+    """
+    mask = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, path: str, callback, logger: Logger = None):
+        super().__init__(name=f"pi3ctrl-inotify-{os.path.basename(path)}", daemon=True)
+        self.path = path
+        self.callback = callback
+        self.logger = logger
+        self._fd = None
+        self._wake = None
+
+    def _log(self, level: str, msg: str):
+        if isinstance(self.logger, Logger):
+            getattr(self.logger, level)(msg)
+
+    def start(self):
+        """Add the inotify watch and start reading events in the thread."""
+        if not inotify_available:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        fd = _libc.inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if _libc.inotify_add_watch(fd, os.fsencode(self.path), self.mask) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, f"Cannot watch {self.path}")
+        self._fd = fd
+        self._wake = os.pipe()
+        super().start()
+
+    def run(self):
+        poller = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        poller.register(self._wake[0], select.POLLIN)
+        try:
+            while True:
+                fds = [fd for fd, _ in poller.poll()]
+                if self._wake[0] in fds:
+                    return
+                for name in self._read_events():
+                    try:
+                        self.callback(name)
+                    except Exception as e:
+                        self._log('error', f"Watch callback for {name} failed: {e}")
+        finally:
+            os.close(self._fd)
+            for fd in self._wake:
+                os.close(fd)
+
+    def _read_events(self):
+        data = os.read(self._fd, 64 * 1024)
+        names = []
+        offset = 0
+        while offset + _event.size <= len(data):
+            _, mask, _, length = _event.unpack_from(data, offset)
+            offset += _event.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='surrogateescape')
+            offset += length
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                self._log('warning', f"Watched directory {self.path} was removed or moved.")
+            elif name and name not in names:
+                names.append(name)
+        return names
+
+    def stop(self):
+        """Stop watching the directory."""
+        if self._wake is None or not self.is_alive():
+            return
+        os.write(self._wake[1], b'\0')
+        self.join()
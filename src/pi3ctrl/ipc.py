@@ -0,0 +1,181 @@
+# Absolute imports
+from logging import Logger
+from queue import Queue, Empty, Full
+from threading import Lock, Thread
+import json
+import os
+import socket
+import socketserver
+
+
+__all__ = ['CoreServer', 'request', 'subscribe']
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Handle JSON-line requests `{"cmd": ..., ...}` with one JSON-line reply
+    `{"ok": ..., ...}` each.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+                if req.get('cmd') == 'subscribe':
+                    return self.stream()
+                func = self.server.commands[req.pop('cmd')]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                resp = dict(ok=False, error='Invalid request')
+            else:
+                try:
+                    resp = dict(ok=True, **(func(**req) or dict()))
+                except Exception as e:
+                    self.server._log('error', f"Control socket command failed: {e}")
+                    resp = dict(ok=False, error=str(e))
+            self.wfile.write(json.dumps(resp).encode() + b'\n')
+            self.wfile.flush()
+
+    def stream(self):
+        """Reply to a `subscribe` request and keep writing published events
+        `{"event": ..., "data": ...}`, with a `ping` event when idle.
+        """
+        queue = self.server.subscribe()
+        try:
+            self.wfile.write(json.dumps(dict(ok=True)).encode() + b'\n')
+            while True:
+                self.wfile.flush()
+                try:
+                    item = queue.get(timeout=self.server.keepalive)
+                except Empty:
+                    item = dict(event='ping', data=None)
+                if item is None:
+                    return
+                self.wfile.write(json.dumps(item).encode() + b'\n')
+        except OSError:
+            pass
+        finally:
+            self.server.unsubscribe(queue)
+
+
+class CoreServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Local Unix domain socket server of pi3ctrl-core serving JSON-line
+    commands, registered as `{name: func(**kwargs) -> dict}`.
+
+    Clients sending `subscribe` receive all events passed to `publish`,
+    starting with the events returned by the `snapshot` callable.
+    """
+    daemon_threads = True
+
+    def __init__(self, path: str, commands: dict = None, mode: int = 0o660, logger: Logger = None,
+                 keepalive: float = 15., backlog: int = 100):
+        self.path = path
+        self.mode = mode
+        self.commands = dict(commands or dict())
+        self.logger = logger
+        self.keepalive = keepalive
+        self.backlog = backlog
+        self.snapshot = None
+        self._subscribers = []
+        self._subscribers_lock = Lock()
+        super().__init__(path, _Handler, bind_and_activate=False)
+        self._thread = None
+
+    def _log(self, level: str, msg: str):
+        if isinstance(self.logger, Logger):
+            getattr(self.logger, level)(msg)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Queue:
+        """Register a new event queue, filled with the snapshot events."""
+        queue = Queue(maxsize=self.backlog)
+        for event, data in (self.snapshot() if self.snapshot else ()):
+            queue.put_nowait(dict(event=event, data=data))
+        with self._subscribers_lock:
+            self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: Queue):
+        with self._subscribers_lock:
+            if queue in self._subscribers:
+                self._subscribers.remove(queue)
+
+    def publish(self, event: str, data=None):
+        """Send an event to all subscribers. Events for subscribers that
+        fall behind by more than `backlog` events are dropped.
+        """
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for queue in subscribers:
+            try:
+                queue.put_nowait(dict(event=event, data=data))
+            except Full:
+                self._log('warning', f"Subscriber queue full, dropping {event} event.")
+
+    def start(self):
+        """Bind the socket and serve in a background thread."""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server_bind()
+        self.server_activate()
+        os.chmod(self.path, self.mode)
+        self._thread = Thread(target=self.serve_forever, name='pi3ctrl-core-socket', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and remove the socket."""
+        if self._thread is None:
+            return
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for queue in subscribers:
+            while True:
+                try:
+                    queue.put_nowait(None)
+                    break
+                except Full:
+                    try:
+                        queue.get_nowait()
+                    except Empty:
+                        pass
+        self.shutdown()
+        self.server_close()
+        self._thread = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def request(path: str, cmd: str, timeout: float = 2., **kwargs) -> dict:
+    """Send a command to the pi3ctrl-core socket and return the reply.
+
+    Raises `OSError` if the core daemon cannot be reached.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(json.dumps(dict(cmd=cmd, **kwargs)).encode() + b'\n')
+        with s.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError(f"No reply from {path}")
+    return json.loads(line)
+
+
+def subscribe(path: str, timeout: float = 30.):
+    """Subscribe to the events of the pi3ctrl-core socket, yielding
+    `{"event": ..., "data": ...}` dicts including the keepalive pings.
+
+    Raises `OSError` if the core daemon cannot be reached or stays silent for
+    `timeout` seconds.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(json.dumps(dict(cmd='subscribe')).encode() + b'\n')
+        with s.makefile('rb') as f:
+            reply = json.loads(f.readline() or b'null')
+            if not reply or not reply.get('ok'):
+                raise ConnectionError(f"Cannot subscribe to {path}")
+            for line in f:
+                yield json.loads(line)
@@ -0,0 +1,134 @@
+# Absolute imports
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from logging import Logger
+from threading import Lock
+from time import monotonic
+import os
+import uuid
+
+
+__all__ = ['Job', 'JobRunner']
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class Job(object):
+    """A function call run in the background."""
+    __slots__ = ('id', 'name', 'key', 'state', 'created', 'started', 'finished', 'result', 'error', 'done_at')
+
+    def __init__(self, name: str, key: tuple):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.key = key
+        self.state = 'queued'  # queued, running, done or failed
+        self.created = _now()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.done_at = None  # monotonic time, for the retention
+
+    @property
+    def active(self) -> bool:
+        return self.state in ('queued', 'running')
+
+    @property
+    def serialize(self) -> dict:
+        return dict(
+            id=self.id,
+            name=self.name,
+            state=self.state,
+            created=self.created,
+            started=self.started,
+            finished=self.finished,
+            result=self.result,
+            error=self.error,
+        )
+
+
+class JobRunner(object):
+    """Run named jobs on a background thread pool, created lazily in each
+    process.
+
+    Submitting a job identical to a queued or running job returns the
+    existing job. Finished jobs are kept for `retention` seconds.
+    """
+
+    def __init__(self, max_workers: int = 1, retention: float = 600., logger: Logger = None):
+        self.max_workers = max_workers
+        self.retention = retention
+        self.logger = logger
+        self._jobs = dict()
+        self._lock = Lock()
+        self._executor = None
+        self._pid = None
+
+    def _log(self, level: str, msg: str):
+        if isinstance(self.logger, Logger):
+            getattr(self.logger, level)(msg)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pi3ctrl-job')
+            self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, name: str, func, **kwargs) -> Job:
+        """Run `func(**kwargs)` as job `name`, or return the identical active job.
+        A result with `success` false marks the job as failed.
+        """
+        key = (name, tuple(sorted(kwargs.items())))
+        with self._lock:
+            self._prune()
+            for job in self._jobs.values():
+                if job.key == key and job.active:
+                    return job
+            job = Job(name, key)
+            self._jobs[job.id] = job
+            self._get_executor().submit(self._run, job, func, kwargs)
+        self._log('info', f"Job {job.id} {name} queued")
+        return job
+
+    def _run(self, job: Job, func, kwargs: dict):
+        job.state = 'running'
+        job.started = _now()
+        try:
+            job.result = func(**kwargs)
+            failed = isinstance(job.result, dict) and job.result.get('success') is False
+            job.state = 'failed' if failed else 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.state = 'failed'
+        job.finished = _now()
+        job.done_at = monotonic()
+        self._log('info' if job.state == 'done' else 'error', f"Job {job.id} {job.name} {job.state}")
+
+    def run(self, name: str, func, **kwargs) -> Job:
+        """Run `func(**kwargs)` as job `name` in the calling thread and return
+        the finished job, which is not kept.
+        """
+        job = Job(name, (name, tuple(sorted(kwargs.items()))))
+        self._run(job, func, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """Get a job by id, or `None` if unknown or expired."""
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        now = monotonic()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.done_at is not None and now - job.done_at > self.retention]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        """Stop the workers without waiting for the running jobs."""
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self._pid = None
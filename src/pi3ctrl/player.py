@@ -0,0 +1,263 @@
+# Absolute imports
+from logging import Logger
+from threading import Event, Lock
+from time import perf_counter
+import os
+import subprocess
+import wave
+
+# Optional imports
+try:
+    import alsaaudio
+except ImportError:
+    alsaaudio = None
+
+# Relative imports
+from .soundfiles import playback_path
+
+
+__all__ = ['SoundBuffer', 'Player', 'AlsaPlayer', 'SubprocessPlayer', 'get_player']
+
+
+# SOUNDFILE_PLAYER value selecting the in-process ALSA engine
+ALSA_PLAYER = 'alsa'
+
+
+class SoundBuffer(object):
+    """A soundFile loaded into memory, ready to be written to the output device."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with wave.open(path, 'rb') as w:
+            self.channels = w.getnchannels()
+            self.sampwidth = w.getsampwidth()
+            self.rate = w.getframerate()
+            self.nframes = w.getnframes()
+            self.frames = w.readframes(self.nframes)
+
+    @property
+    def format(self) -> tuple:
+        """Tuple identifying the PCM format of the buffer."""
+        return (self.channels, self.sampwidth, self.rate)
+
+    @property
+    def duration(self) -> float:
+        """Duration of the buffer in seconds."""
+        return self.nframes / self.rate if self.rate else 0.
+
+
+class Player(object):
+    """Base soundFile player.
+
+    Every soundFile is resolved once and playback is requested by path. The
+    playback-ready variant of a soundFile is played if prepared.
+    """
+
+    def __init__(self, config, logger: Logger = None):
+        self.config = config
+        self.logger = logger
+        self.started = None  # perf_counter() time the output of the last playback started
+        self._stop_event = Event()
+
+    def _log(self, level: str, msg: str):
+        if isinstance(self.logger, Logger):
+            getattr(self.logger, level)(msg)
+
+    def load(self, paths):
+        """Prepare a list of soundFile paths for playback."""
+        pass
+
+    def reload(self, path: str):
+        """Prepare a soundFile again after it changed on disk."""
+        pass
+
+    def clone(self):
+        """New player sharing the prepared soundFiles, with its own output."""
+        return self.__class__(self.config, self.logger)
+
+    def play(self, path: str) -> bool:
+        """Play the soundFile and block until done or stopped. Returns `True`
+        on success.
+        """
+        raise NotImplementedError
+
+    def ready(self):
+        """Clear a pending stop request before the next playback."""
+        self._stop_event.clear()
+
+    def stop(self):
+        """Stop the current playback."""
+        self._stop_event.set()
+
+    def close(self):
+        """Release the output device."""
+        pass
+
+
+class SubprocessPlayer(Player):
+    """Fallback player spawning `SOUNDFILE_PLAYER` for every playback."""
+
+    def __init__(self, config, logger: Logger = None, command: str = None):
+        super().__init__(config, logger)
+        self.command = command or config['SOUNDFILE_PLAYER']
+        self._process = None
+
+    def clone(self):
+        return self.__class__(self.config, self.logger, command=self.command)
+
+    def play(self, path: str) -> bool:
+        if self._stop_event.is_set():
+            return True
+        command = f"{self.command} {playback_path(path)} -v"
+        self._log('debug', f"Execute command: {command}")
+        self._process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE, text=True)
+        self.started = perf_counter()
+        stdout, _ = self._process.communicate()
+        self._log('debug', f"Command output: {stdout}")
+        return self._process.returncode == 0 or self._stop_event.is_set()
+
+    def stop(self):
+        super().stop()
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+
+
+class AlsaPlayer(Player):
+    """In-process player writing preloaded soundFile buffers to an ALSA device
+    that is kept open between playbacks.
+
+    Files that cannot be parsed as WAV are played by the subprocess fallback.
+    """
+
+    _formats = {
+        1: 'PCM_FORMAT_U8',
+        2: 'PCM_FORMAT_S16_LE',
+        3: 'PCM_FORMAT_S24_3LE',
+        4: 'PCM_FORMAT_S32_LE',
+    }
+
+    def __init__(self, config, logger: Logger = None, buffers: dict = None, buffers_lock: Lock = None):
+        super().__init__(config, logger)
+        self.device = config['SOUNDFILE_DEVICE']
+        self.periodsize = config['SOUNDFILE_PERIODSIZE']
+        self.fallback = SubprocessPlayer(config, logger, command=config['SOUNDFILE_FALLBACK_PLAYER'])
+        self._buffers = dict() if buffers is None else buffers
+        self._buffers_lock = buffers_lock or Lock()
+        self._pcm = None
+        self._pcm_format = None
+
+    def clone(self):
+        return self.__class__(self.config, self.logger, buffers=self._buffers, buffers_lock=self._buffers_lock)
+
+    def stop(self):
+        super().stop()
+        self.fallback.stop()
+
+    def ready(self):
+        super().ready()
+        self.fallback.ready()
+
+    def load(self, paths):
+        buffers = [self.load_file(path) for path in paths]
+        buffers = [buffer for buffer in buffers if buffer is not None]
+        try:
+            self.open(*(buffers[0].format if buffers else self.config['SOUNDFILE_OUTPUT_FORMAT']))
+        except alsaaudio.ALSAAudioError as e:
+            self._log('error', f"Cannot open ALSA device {self.device}: {e}")
+
+    def load_file(self, path: str):
+        """Load (or reload) a single soundFile into memory."""
+        try:
+            buffer = SoundBuffer(playback_path(path))
+        except FileNotFoundError:
+            buffer = None
+        except (wave.Error, EOFError) as e:
+            self._log('warning', f"Cannot preload {path} ({e}), using {self.fallback.command}.")
+            buffer = None
+        with self._buffers_lock:
+            self._buffers[path] = buffer
+        if buffer is not None:
+            self._log('debug', f"Preloaded {path}: {buffer.channels}ch {buffer.rate}Hz "
+                               f"{8 * buffer.sampwidth}bit {buffer.duration:.2f}s")
+        return buffer
+
+    def reload(self, path: str):
+        self.load_file(path)
+
+    def get_buffer(self, path: str):
+        """Get the in-memory buffer of a soundFile, loading it on first use.
+        Changed files are reloaded through `reload`.
+        """
+        with self._buffers_lock:
+            if path in self._buffers:
+                return self._buffers[path]
+        return self.load_file(path)
+
+    def open(self, channels: int = 2, sampwidth: int = 2, rate: int = 44100):
+        """Open the output device for the given PCM format, if not already open."""
+        if self._pcm is not None and self._pcm_format == (channels, sampwidth, rate):
+            return self._pcm
+        self.close()
+        self._pcm = alsaaudio.PCM(
+            type=alsaaudio.PCM_PLAYBACK,
+            mode=alsaaudio.PCM_NORMAL,
+            device=self.device,
+            channels=channels,
+            rate=rate,
+            format=getattr(alsaaudio, self._formats[sampwidth]),
+            periodsize=self.periodsize,
+        )
+        self._pcm_format = (channels, sampwidth, rate)
+        self._log('debug', f"Opened ALSA device {self.device} for {channels}ch {rate}Hz {8 * sampwidth}bit")
+        return self._pcm
+
+    def play(self, path: str) -> bool:
+        buffer = self.get_buffer(path)
+        if buffer is None:
+            if not os.path.isfile(path):
+                self._log('error', f"SoundFile {path} not found.")
+                return False
+            success = self.fallback.play(path)
+            self.started = self.fallback.started
+            return success
+
+        try:
+            pcm = self.open(*buffer.format)
+            chunk = self.periodsize * buffer.channels * buffer.sampwidth
+            frames = memoryview(buffer.frames)
+            self.started = perf_counter()
+            for offset in range(0, len(frames), chunk):
+                if self._stop_event.is_set():
+                    pcm.drop()
+                    break
+                pcm.write(frames[offset:offset + chunk])
+            else:
+                pcm.drain()
+        except alsaaudio.ALSAAudioError as e:
+            self._log('error', f"ALSA playback of {path} failed: {e}")
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        if self._pcm is not None:
+            self._pcm.close()
+        self._pcm = None
+        self._pcm_format = None
+
+
+def get_player(config, logger: Logger = None) -> Player:
+    """Create the player selected by `SOUNDFILE_PLAYER`.
+
+    `'alsa'` selects the in-process engine, any other value is the command of
+    the subprocess fallback player.
+    """
+    if config['SOUNDFILE_PLAYER'] != ALSA_PLAYER:
+        return SubprocessPlayer(config, logger)
+    if alsaaudio is None:
+        if isinstance(logger, Logger):
+            logger.warning("pyalsaaudio is not available, falling back to "
+                           f"{config['SOUNDFILE_FALLBACK_PLAYER']}.")
+        return SubprocessPlayer(config, logger, command=config['SOUNDFILE_FALLBACK_PLAYER'])
+    return AlsaPlayer(config, logger)
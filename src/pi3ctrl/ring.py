@@ -0,0 +1,225 @@
+# Absolute imports
+from datetime import datetime, timezone
+from logging import Logger
+from threading import Lock
+from time import sleep
+import mmap
+import os
+import struct
+
+# Relative imports
+from .database import button_pin, dump_datetime
+
+
+__all__ = ['TriggerRing', 'RingReader']
+
+
+# Layout: header, live counters per button and the slots, little-endian
+magic = b'P3RB'
+version = 1
+header = struct.Struct('<4sHHII')  # magic, version, max_buttons, slots, slot_size
+header_seq = 16  # seqlock of the head, start time and counters
+header_head = 24  # number of triggers written
+header_started = 32  # epoch of the writer start
+header_counts = 40
+slot = struct.Struct('<QdHHB7x')  # seq, created epoch, button, pin, outcome
+counter = struct.Struct('<Q')
+started = struct.Struct('<d')
+
+outcomes = ('played', 'queued', 'preempted', 'mixed', 'dropped')
+
+
+def slots_offset(max_buttons: int) -> int:
+    """Offset of the first slot, cache line aligned."""
+    return -(-(header_counts + counter.size * max_buttons) // 64) * 64
+
+
+def epoch(created: datetime) -> float:
+    return created.replace(tzinfo=timezone.utc).timestamp()
+
+
+def from_epoch(value: float) -> datetime:
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+
+class TriggerRing(object):
+    """Fixed-size ring buffer of the recent triggers in a shared memory file,
+    written by pi3ctrl-core and read lock-free by the http workers.
+
+    Every slot and the header are guarded by a sequence number that is odd
+    while being written: a reader retries or skips the data whose sequence
+    changed while copying it. The database remains the durable record.
+    """
+
+    def __init__(self, path: str, slots: int = 4096, max_buttons: int = 32, mode: int = 0o660):
+        self.path = path
+        self.slots = slots
+        self.max_buttons = max_buttons
+        self._offset = slots_offset(max_buttons)
+        self._lock = Lock()  # single writer within the core
+        self._head = 0
+        self._counts = [0] * max_buttons
+
+        # Reuse the file (and its inode) of a previous run, the readers keep their
+        # mapping. A file of another size is replaced: truncating a mapped file
+        # would crash its readers.
+        size = self._offset + slot.size * slots
+        try:
+            if os.path.getsize(path) != size:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, mode)
+        try:
+            os.fchmod(fd, mode)
+            os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        # Invalidate the previous content before publishing the new layout
+        seq = counter.unpack_from(self._mm, header_seq)[0] if self._mm[:4] == magic else 0
+        self._seq = seq + 1 + seq % 2
+        counter.pack_into(self._mm, header_seq, self._seq)
+        self._mm[self._offset:] = bytes(size - self._offset)
+        header.pack_into(self._mm, 0, magic, version, max_buttons, slots, slot.size)
+        counter.pack_into(self._mm, header_head, 0)
+        started.pack_into(self._mm, header_started, datetime.now(timezone.utc).timestamp())
+        self._mm[header_counts:header_counts + counter.size * max_buttons] = bytes(counter.size * max_buttons)
+        self._seq += 1
+        counter.pack_into(self._mm, header_seq, self._seq)
+
+    def append(self, button: int, pin: int, outcome: str, created: datetime):
+        """Publish a trigger, overwriting the oldest one."""
+        with self._lock:
+            n = self._head
+            offset = self._offset + slot.size * (n % self.slots)
+            counter.pack_into(self._mm, offset, 2 * n + 1)
+            slot.pack_into(self._mm, offset, 2 * n + 1, epoch(created), button, pin, outcomes.index(outcome))
+            counter.pack_into(self._mm, offset, 2 * n + 2)
+
+            self._head = n + 1
+            self._seq += 1
+            counter.pack_into(self._mm, header_seq, self._seq)
+            counter.pack_into(self._mm, header_head, self._head)
+            if 0 <= button < self.max_buttons:
+                self._counts[button] += 1
+                counter.pack_into(self._mm, header_counts + counter.size * button, self._counts[button])
+            self._seq += 1
+            counter.pack_into(self._mm, header_seq, self._seq)
+
+    def close(self):
+        self._mm.close()
+
+
+class RingReader(object):
+    """Lock-free reader of the trigger ring buffer of pi3ctrl-core.
+
+    The file is mapped on first use and remapped when it is replaced. All
+    reads return `None` if the ring is not available, fall back to the
+    database then.
+    """
+
+    def __init__(self, path: str, retries: int = 100, logger: Logger = None):
+        self.path = path
+        self.retries = retries
+        self.logger = logger
+        self._mm = None
+        self._inode = None
+        self._lock = Lock()  # guards the (re)mapping, not the reads
+
+    def _map(self):
+        """The current mapping of the ring file, or `None`."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        if self._mm is not None and self._inode == (st.st_dev, st.st_ino):
+            return self._mm
+        with self._lock:
+            try:
+                with open(self.path, 'rb') as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as e:
+                if isinstance(self.logger, Logger):
+                    self.logger.warning(f"Cannot map the trigger ring {self.path}: {e}")
+                return None
+            if len(mm) < header.size or header.unpack_from(mm)[:2] != (magic, version):
+                mm.close()
+                return None
+            _, _, max_buttons, slots, slot_size = header.unpack_from(mm)
+            if slot_size != slot.size or len(mm) < slots_offset(max_buttons) + slot.size * slots:
+                mm.close()
+                return None
+            # a previous mapping is left to the garbage collector, other threads may still read it
+            self._mm, self._inode = mm, (st.st_dev, st.st_ino)
+            return mm
+
+    def _header(self, mm) -> tuple:
+        """Consistent head, start time and counters, or `None` if the writer
+        kept updating them.
+        """
+        _, _, max_buttons, slots, _ = header.unpack_from(mm)
+        for _ in range(self.retries):
+            seq = counter.unpack_from(mm, header_seq)[0]
+            if seq % 2 == 0:
+                head = counter.unpack_from(mm, header_head)[0]
+                start = started.unpack_from(mm, header_started)[0]
+                counts = struct.unpack_from(f'<{max_buttons}Q', mm, header_counts)
+                if counter.unpack_from(mm, header_seq)[0] == seq:
+                    return head, start, counts, slots, slots_offset(max_buttons)
+            sleep(0)  # let the writer finish, it may share the cpu
+        return None
+
+    def snapshot(self, since: datetime = None, limit: int = None) -> dict:
+        """The live counters per button since the core started and the recent
+        triggers, newest first, created at or after `since` and at most
+        `limit`. `complete` is false if the ring does not reach back that far.
+        Returns `None` if the ring is not available.
+        """
+        mm = self._map()
+        if mm is None:
+            return None
+        state = self._header(mm)
+        if state is None:
+            return None
+        head, start, counts, slots, offset = state
+
+        # Newest first until the limit, the since time or an overwritten slot
+        since = epoch(since) if since else None
+        triggers = []
+        complete = False
+        for n in range(head - 1, max(head - slots, 0) - 1, -1):
+            if limit is not None and len(triggers) >= limit:
+                complete = True
+                break
+            seq, created, button, pin, outcome = slot.unpack_from(mm, offset + slot.size * (n % slots))
+            if seq != 2 * n + 2 or counter.unpack_from(mm, offset + slot.size * (n % slots))[0] != seq:
+                break  # overwritten since the header was read
+            if since is not None and created < since:
+                complete = True
+                break
+            triggers.append(dict(
+                seq=n,
+                button=button,
+                pin=pin,
+                name=button_pin(button, pin),
+                created=dump_datetime(from_epoch(created)),
+                outcome=outcomes[outcome] if outcome < len(outcomes) else None,
+            ))
+        else:
+            # all triggers since the writer started
+            complete = head <= slots and since is not None and since >= start
+
+        return dict(
+            started=dump_datetime(from_epoch(start)),
+            counts={str(button): count for button, count in enumerate(counts) if count},
+            triggers=triggers,
+            complete=complete,
+        )
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+            self._mm = self._inode = None
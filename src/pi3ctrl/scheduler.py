@@ -0,0 +1,115 @@
+# Absolute imports
+from logging import Logger
+from threading import Thread, Condition
+from time import monotonic
+import heapq
+import itertools
+
+
+__all__ = ['Scheduler']
+
+
+class Timer(object):
+    """Handle of a scheduled callback."""
+    __slots__ = ('when', 'func', 'args', 'cancelled')
+
+    def __init__(self, when: float, func, args: tuple):
+        self.when = when
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler(Thread):
+    """Single thread running all timed callbacks from a timer heap.
+
+    Animations are declarative lists of `(value, seconds)` steps that repeat
+    until replaced. A step lasting `None` seconds is held indefinitely.
+    """
+
+    def __init__(self, logger: Logger = None):
+        super().__init__(name='pi3ctrl-scheduler', daemon=True)
+        self.logger = logger
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = Condition()
+        self._animations = dict()
+        self._running = True
+
+    def call_at(self, when: float, func, *args) -> Timer:
+        """Schedule `func(*args)` at the monotonic time `when`."""
+        timer = Timer(when, func, args)
+        with self._condition:
+            heapq.heappush(self._heap, (when, next(self._counter), timer))
+            self._condition.notify()
+        return timer
+
+    def call_later(self, delay: float, func, *args) -> Timer:
+        """Schedule `func(*args)` after `delay` seconds."""
+        return self.call_at(monotonic() + delay, func, *args)
+
+    def call_soon(self, func, *args) -> Timer:
+        """Schedule `func(*args)` as soon as possible."""
+        return self.call_at(monotonic(), func, *args)
+
+    def animate(self, key, steps: list, func):
+        """Replace the animation of `key` by calling `func(value)` for each
+        `(value, seconds)` step, repeating the steps until replaced.
+        """
+        token = object()
+        with self._condition:
+            previous = self._animations.get(key)
+            if previous is not None:
+                previous[1].cancel()
+            self._animations[key] = (token, self.call_soon(self._step, key, token, steps, 0, func))
+
+    def cancel(self, key):
+        """Stop the animation of `key`."""
+        with self._condition:
+            previous = self._animations.pop(key, None)
+            if previous is not None:
+                previous[1].cancel()
+
+    def _step(self, key, token, steps: list, index: int, func):
+        with self._condition:
+            current = self._animations.get(key)
+            if current is None or current[0] is not token:
+                return
+        value, seconds = steps[index]
+        func(value)
+        if seconds is None:
+            return
+        with self._condition:
+            if self._animations.get(key) is not current:
+                return
+            # schedule relative to the planned time to avoid drift
+            self._animations[key] = (token, self.call_at(
+                current[1].when + seconds, self._step, key, token, steps, (index + 1) % len(steps), func
+            ))
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._running and (not self._heap or self._heap[0][0] > monotonic()):
+                    self._condition.wait(self._heap[0][0] - monotonic() if self._heap else None)
+                if not self._running:
+                    return
+                _, _, timer = heapq.heappop(self._heap)
+            if timer.cancelled:
+                continue
+            try:
+                timer.func(*timer.args)
+            except Exception as e:
+                if isinstance(self.logger, Logger):
+                    self.logger.error(f"Scheduled callback {timer.func.__name__} failed: {e}")
+
+    def stop(self):
+        """Stop the scheduler thread, discarding pending callbacks."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self.is_alive():
+            self.join()
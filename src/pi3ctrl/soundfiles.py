@@ -0,0 +1,348 @@
+# Absolute imports
+from datetime import datetime, timezone
+from logging import Logger
+from threading import RLock
+import hashlib
+import json
+import os
+import re
+import tempfile
+import wave
+
+# Relative imports
+from .inotify import DirectoryWatcher
+
+
+__all__ = ['soundFile', 'variant_path', 'playback_path', 'read_variant', 'HashingFile', 'wav_info', 'read_meta',
+           'store_soundfile', 'SoundFileEntry', 'Catalog']
+
+
+def soundFile(button: int, pin: int) -> str:
+    """Construct the soundFile name.
+    """
+    return f"soundFile.{button}.GPIO{pin}"
+
+
+def meta_path(path: str) -> str:
+    """Path of the metadata file stored next to a soundFile."""
+    return f"{path}.json"
+
+
+def variant_path(path: str) -> str:
+    """Path of the playback-ready variant stored next to a soundFile."""
+    return f"{path}.play.wav"
+
+
+def playback_path(path: str) -> str:
+    """The playback-ready variant of a soundFile if prepared, else the soundFile."""
+    variant = variant_path(path)
+    return variant if os.path.isfile(variant) else path
+
+
+def read_variant(path: str) -> dict:
+    """Read the description of the variant of a soundFile, or `None`."""
+    try:
+        with open(f"{variant_path(path)}.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def remove_variant(path: str):
+    for name in (variant_path(path), f"{variant_path(path)}.json"):
+        try:
+            os.unlink(name)
+        except FileNotFoundError:
+            pass
+
+
+class HashingFile(object):
+    """Temporary upload file in the soundFile folder computing the SHA-256
+    and size while it is written. The file is removed on close unless it was
+    stored.
+    """
+
+    def __init__(self, folder: str):
+        os.makedirs(folder, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=folder, prefix='.upload-', delete=False)
+        self.name = self._file.name
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.stored = False
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def close(self):
+        self._file.close()
+        if not self.stored and os.path.exists(self.name):
+            os.unlink(self.name)
+
+    def __getattr__(self, attr):
+        return getattr(self._file, attr)
+
+
+def wav_info(path: str) -> dict:
+    """WAV header metadata of a file, or `None` if it is not a WAV file."""
+    try:
+        with wave.open(path, 'rb') as w:
+            info = dict(
+                channels=w.getnchannels(),
+                sampwidth=w.getsampwidth(),
+                rate=w.getframerate(),
+                nframes=w.getnframes(),
+            )
+    except (wave.Error, EOFError):
+        return None
+    info['duration'] = info['nframes'] / info['rate'] if info['rate'] else 0.
+    return info
+
+
+def validate_wav(info: dict) -> str:
+    """Return the reason a WAV file cannot be played, or `None` if valid."""
+    if info is None:
+        return "Not a valid WAV file"
+    if not 1 <= info['channels'] <= 8:
+        return f"Unsupported number of channels {info['channels']}"
+    if info['sampwidth'] not in (1, 2, 3, 4):
+        return f"Unsupported sample width {info['sampwidth']}"
+    if not 8000 <= info['rate'] <= 192000:
+        return f"Unsupported sample rate {info['rate']}"
+    if info['nframes'] == 0:
+        return "Empty WAV file"
+    return None
+
+
+def read_meta(path: str) -> dict:
+    """Read the stored metadata of a soundFile, or `None` if unavailable."""
+    try:
+        with open(meta_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_soundfile(upload: HashingFile, path: str, filename: str) -> tuple:
+    """Validate a completed upload and atomically rename it to the soundFile
+    path with its metadata. Returns `(metadata, error)`.
+
+    The variant of the previous soundFile is removed, pi3ctrl-core prepares
+    the new one when its catalog picks up the rename.
+    """
+    upload.flush()
+    os.fsync(upload.fileno())
+
+    if upload.size == 0:
+        return None, "Empty file"
+
+    ext = filename.rsplit('.', 1)[-1].lower()
+    info = wav_info(upload.name)
+    if ext == 'wav':
+        error = validate_wav(info)
+        if error:
+            return None, error
+
+    meta = dict(
+        filename=filename,
+        sha256=upload.sha256.hexdigest(),
+        size=upload.size,
+        uploaded=datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        wav=info,
+    )
+
+    # write the metadata first, then move the soundFile into place
+    tmp_meta = f"{upload.name}.json"
+    with open(tmp_meta, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, meta_path(path))
+    os.chmod(upload.name, 0o644)
+    remove_variant(path)
+    os.replace(upload.name, path)
+    upload.stored = True
+
+    return meta, None
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class SoundFileEntry(object):
+    """Catalog entry of a soundFile."""
+    __slots__ = ('button', 'pin', 'path', 'size', 'mtime', 'sha256', 'channels', 'rate', 'duration')
+
+    def __init__(self, button: int, pin: int, path: str, size: int, mtime: float, sha256: str,
+                 info: dict = None):
+        self.button = button
+        self.pin = pin
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.sha256 = sha256
+        self.channels = info['channels'] if info else None
+        self.rate = info['rate'] if info else None
+        self.duration = info['duration'] if info else None
+
+    @property
+    def serialize(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Catalog(object):
+    """Index of the soundFiles in a folder with their size, mtime, checksum
+    and WAV properties.
+
+    The folder is scanned on first use in each process and kept current by an
+    inotify watcher. Without inotify the folder is rescanned when its mtime
+    changes. Callbacks registered with `subscribe` are called with the path
+    of every soundFile that changed.
+    """
+    pattern = re.compile(r'^soundFile\.(\d+)\.GPIO(\d+)$')
+
+    def __init__(self, folder: str, logger: Logger = None):
+        self.folder = folder
+        self.logger = logger
+        self.version = 0  # incremented on every change
+        self._entries = dict()
+        self._callbacks = []
+        self._lock = RLock()
+        self._pid = None
+        self._watcher = None
+        self._folder_mtime = None
+        self._token = (None, None)
+
+    def _log(self, level: str, msg: str):
+        if isinstance(self.logger, Logger):
+            getattr(self.logger, level)(msg)
+
+    def subscribe(self, callback):
+        """Call `callback(path)` whenever a soundFile is added, changed or removed."""
+        self._callbacks.append(callback)
+
+    def path(self, button: int, pin: int) -> str:
+        """Path of the soundFile of a button."""
+        return os.path.join(self.folder, soundFile(button, pin))
+
+    def get(self, button: int, pin: int) -> SoundFileEntry:
+        """Get the entry of the soundFile of a button, or `None` if missing."""
+        self._ensure_current()
+        return self._entries.get(soundFile(button, pin))
+
+    def entries(self) -> list:
+        """All soundFile entries."""
+        self._ensure_current()
+        with self._lock:
+            return list(self._entries.values())
+
+    @property
+    def token(self) -> str:
+        """Checksum of the indexed soundFiles, equal in every process for the
+        same folder content.
+        """
+        self._ensure_current()
+        with self._lock:
+            if self._token[0] != self.version:
+                state = sorted((name, e.size, e.sha256) for name, e in self._entries.items())
+                self._token = (self.version, hashlib.sha256(json.dumps(state).encode()).hexdigest())
+            return self._token[1]
+
+    def _ensure_current(self):
+        # (re)start in a new process, the watcher thread does not survive a fork
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+        elif self._watcher is None and self._folder_changed():
+            self.scan()
+
+    def _start(self):
+        self._watcher = None
+        try:
+            os.makedirs(self.folder, exist_ok=True)  # the watcher needs the folder, uploads create it otherwise
+            watcher = DirectoryWatcher(self.folder, self._on_event, logger=self.logger)
+            watcher.start()
+            self._watcher = watcher
+        except OSError as e:
+            self._log('warning', f"Cannot watch {self.folder} ({e}), checking its mtime instead.")
+        self._folder_changed()
+        self._scan()
+        self._pid = os.getpid()
+
+    def _folder_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            mtime = None
+        changed = mtime != self._folder_mtime
+        self._folder_mtime = mtime
+        return changed
+
+    def _on_event(self, name: str):
+        if name.endswith('.json'):
+            name = name[:-len('.json')]
+        if self.pattern.match(name):
+            self.refresh(name)
+
+    def scan(self):
+        """Rescan the whole folder."""
+        with self._lock:
+            self._scan()
+
+    def _scan(self):
+        try:
+            names = [name for name in os.listdir(self.folder) if self.pattern.match(name)]
+        except OSError:
+            names = []
+        for name in set(self._entries) | set(names):
+            self._refresh(name)
+
+    def refresh(self, name: str):
+        """Update the entry of a single soundFile by name."""
+        with self._lock:
+            self._refresh(name)
+
+    def _refresh(self, name: str):
+        path = os.path.join(self.folder, name)
+        previous = self._entries.get(name)
+        try:
+            entry = self._index(name, path, previous)
+        except OSError:
+            entry = None
+        if entry is previous:
+            return
+        if entry is None:
+            del self._entries[name]
+        else:
+            self._entries[name] = entry
+        self.version += 1
+        self._log('debug', f"Catalog updated {path}")
+        for callback in self._callbacks:
+            try:
+                callback(path)
+            except Exception as e:
+                self._log('error', f"Catalog callback for {path} failed: {e}")
+
+    def _index(self, name: str, path: str, previous: SoundFileEntry = None) -> SoundFileEntry:
+        stat = os.stat(path)
+        if previous is not None and (previous.size, previous.mtime) == (stat.st_size, stat.st_mtime):
+            return previous
+        meta = read_meta(path)
+        if meta is not None and meta.get('size') == stat.st_size:
+            sha256, info = meta['sha256'], meta.get('wav')
+        else:
+            sha256, info = file_sha256(path), wav_info(path)
+        button, pin = (int(g) for g in self.pattern.match(name).groups())
+        return SoundFileEntry(button, pin, path, stat.st_size, stat.st_mtime, sha256, info)
+
+    def close(self):
+        """Stop watching the folder."""
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
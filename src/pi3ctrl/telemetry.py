@@ -0,0 +1,178 @@
+# Absolute imports
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+import bisect
+
+
+__all__ = ['Counter', 'Histogram', 'Registry', 'registry']
+
+
+default_buckets = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60.)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric(object):
+    """Base class of a metric family with optional labels."""
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = dict()
+        self._lock = Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        """Get the child metric of the given label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def _samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            yield dict(zip(self.labelnames, key)), child
+
+    def render(self) -> str:
+        """Render the metric family in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, child in self._samples():
+            lines.extend(child.render(self.name, labels))
+        return '\n'.join(lines)
+
+
+class _CounterChild(object):
+
+    def __init__(self):
+        self._value = 0.
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1.):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def render(self, name: str, labels: dict):
+        yield f"{name}{_format_labels(labels)} {_format_value(self._value)}"
+
+
+class _HistogramChild(object):
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.
+        self._lock = Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the context in seconds."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start)
+
+    def render(self, name: str, labels: dict):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f"{name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}"
+        yield f"{name}_sum{_format_labels(labels)} {_format_value(total)}"
+        yield f"{name}_count{_format_labels(labels)} {cumulative}"
+
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self.labels()
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.):
+        self.labels().inc(amount)
+
+
+class Histogram(Metric):
+    """Histogram of observed values, such as durations in seconds."""
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = default_buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if not self.labelnames:
+            self.labels()
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+class Registry(object):
+    """Collection of metric families rendered together."""
+
+    def __init__(self):
+        self._metrics = dict()
+        self._lock = Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = default_buckets) -> Histogram:
+        """Get or create a histogram."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# Default registry of the process
+registry = Registry()
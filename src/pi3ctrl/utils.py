@@ -1,8 +1,11 @@
 # absolute imports
 from configparser import ConfigParser, MissingSectionHeaderError
+from datetime import datetime, timezone
 from flask import current_app as app
 from logging import Logger
-from subprocess import Popen, PIPE
+from subprocess import Popen, PIPE, TimeoutExpired, run
+from threading import Lock
+from time import time
 import logging
 import os
 import re
@@ -33,8 +36,35 @@ def is_raspberry_pi() -> bool:
 is_RPi = is_raspberry_pi()
 
 
+_ipv4_cache = dict(signature=None, ip=None)
+_ipv4_cache_lock = Lock()
+
+
+def network_signature() -> str:
+    """Cheap signature of the network configuration, changing when interfaces
+    or their routes change.
+    """
+    try:
+        with open('/proc/net/route') as f:
+            return f.read()
+    except OSError:
+        return repr(socket.if_nameindex()) if hasattr(socket, 'if_nameindex') else ''
+
+
 def get_ipv4_address() -> str:
-    """Get the RPi's private IPv4 address"""
+    """Get the RPi's private IPv4 address, looked up again only when the
+    network configuration changed.
+    """
+    signature = network_signature()
+    with _ipv4_cache_lock:
+        if _ipv4_cache['signature'] != signature or _ipv4_cache['ip'] is None:
+            _ipv4_cache['ip'] = lookup_ipv4_address()
+            _ipv4_cache['signature'] = signature
+        return _ipv4_cache['ip']
+
+
+def lookup_ipv4_address() -> str:
+    """Look up the RPi's private IPv4 address"""
     try:
         hostname_ips = socket.gethostbyname_ex(socket.gethostname())[2]
         ip_list = [ip for ip in hostname_ips if not ip.startswith("127.")]
@@ -92,45 +122,116 @@ def parse_config(configfiles, config=None, defaults=None, logger=None, environ=F
     return config
 
 
+def parse_datetime(value: str) -> datetime:
+    """Parse an ISO 8601 date or datetime string into a naive UTC datetime.
+    Naive input is assumed to be UTC already.
+    """
+    dt = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+systemd_properties = ('Id', 'Description', 'LoadState', 'ActiveState', 'SubState', 'Result',
+                      'MainPID', 'ActiveEnterTimestamp', 'MemoryCurrent')
+
+_systemd_cache = dict(time=0., status=dict())
+_systemd_cache_lock = Lock()
+
+
+def systemd_show(services: list) -> dict:
+    """Get the systemd unit properties of all services with a single
+    `systemctl show` call.
+    """
+    try:
+        p = run(
+            ['/usr/bin/systemctl', 'show', '--no-pager', '-p', ','.join(systemd_properties), *services],
+            capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, TimeoutExpired) as e:
+        return {s: dict(service=s, status=None, success=False, returncode=None, properties=None,
+                        stdout=None, stderr=str(e)) for s in services}
+
+    # one block of key=value lines per service, in order, separated by a blank line
+    blocks = p.stdout.strip('\n').split('\n\n') if p.stdout.strip() else []
+    status = dict()
+    for service, block in zip(services, blocks):
+        props = dict(line.split('=', 1) for line in block.splitlines() if '=' in line)
+        if props.get('LoadState') == 'not-found':
+            returncode = 4
+            state = 'not found'
+            stderr = f"Unit {service} could not be found."
+        else:
+            returncode = 0 if props.get('ActiveState') == 'active' else 3
+            state = f"{props.get('ActiveState')} ({props.get('SubState')})"
+            stderr = ''
+        status[service] = dict(
+            service=service,
+            status=state,
+            success=returncode == 0,
+            returncode=returncode,
+            properties=props,
+            stdout="<br>".join(f"{k}: {v}" for k, v in props.items()),
+            stderr=stderr,
+        )
+    for service in services[len(blocks):]:
+        status[service] = dict(service=service, status=None, success=False, returncode=p.returncode,
+                               properties=None, stdout=None, stderr=p.stderr)
+    return status
+
+
+def systemd_status_cached(services: list, ttl: float) -> dict:
+    """Get the systemd status of the services from a cache shared by all
+    threads, refreshed by a single batched query when older than `ttl` seconds.
+    """
+    with _systemd_cache_lock:
+        cached = _systemd_cache['status']
+        if time() - _systemd_cache['time'] > ttl:
+            _systemd_cache['status'] = cached = systemd_show(services)
+            _systemd_cache['time'] = time()
+        elif any(s not in cached for s in services):
+            cached.update(systemd_show([s for s in services if s not in cached]))
+        return {s: cached[s] for s in services}
+
+
 def systemd_status(service: str) -> dict:
     """Get the systemd status of a single service.
     """
-    r = system_call(['/usr/bin/systemctl', 'status', service], as_dict=True)
-    if r['stdout'] and 'Active: ' in r['stdout']:
-        status = r['stdout'].split('<br>')[2].split('Active: ')[1]
-        if 'since' in status:
-            status = status.split(' since ')[0]
-    else:
-        status = None
-    return dict(service=service, status=status, **r)
+    return systemd_status_cached([service], app.config['SYSTEMD_STATUS_TTL'])[service]
 
 
 def systemd_status_all() -> dict:
     """Get the systemd status of all services.
     """
-    status = dict()
     services = core_services + app.config['SYSTEMD_STATUS']
-    for s in services:
-        status[s] = systemd_status(s)
-    return status
+    return systemd_status_cached(services, app.config['SYSTEMD_STATUS_TTL'])
 
 
-def wifi_ssid_passphrase(ssid: str, passphrase: str) -> dict:
+def wifi_ssid_passphrase(ssid: str, passphrase: str, timeout: float = None) -> dict:
     """Add Wi-Fi ssid and passphrase to wpa_supplicant and connect.
     """
     cmd = ['/usr/bin/sudo', 'nmcli', 'd', 'wifi', 'connect', ssid, 'password', passphrase]
-    return system_call(cmd, as_dict=True)
+    return system_call(cmd, as_dict=True, timeout=timeout)
 
 
-def wifi_autohotspot() -> dict:
+def wifi_autohotspot(timeout: float = None) -> dict:
     """Run autohotspot.
     """
-    return system_call(['/usr/bin/sudo', '/usr/bin/systemctl', 'start', 'pi3ctrl-wifi'], as_dict=True)
+    return system_call(['/usr/bin/sudo', '/usr/bin/systemctl', 'start', 'pi3ctrl-wifi'], as_dict=True,
+                       timeout=timeout)
+
+
+# Jobs that can be requested, by name
+job_functions = dict(
+    wifi_connect=wifi_ssid_passphrase,
+    autohotspot=wifi_autohotspot,
+)
 
 
-def system_call(*args, logger: Logger = None, as_dict: bool = False, **kwargs):
+def system_call(*args, logger: Logger = None, as_dict: bool = False, timeout: float = None, **kwargs):
     """Wraps Popen and Popen.communicate() in a catch error statement and
-    returns a serialized dictionary object for jsonify.
+    returns a serialized dictionary object for jsonify. A call running longer
+    than `timeout` seconds is killed and fails.
     """
 
     log = isinstance(logger, Logger)
@@ -151,12 +252,18 @@ def system_call(*args, logger: Logger = None, as_dict: bool = False, **kwargs):
         p = Popen(*args, **kwargs, stdout=PIPE, stderr=PIPE)
     except OSError as e:
         logger.error(e) if log else None
-        return _resp_dict('error', e) if as_dict else False
+        return _resp_dict(stderr=str(e)) if as_dict else False
 
     try:
         # wait for process to finish;
         # this also sets the returncode variable inside 'p'
-        stdout, stderr = p.communicate()
+        try:
+            stdout, stderr = p.communicate(timeout=timeout)
+        except TimeoutExpired:
+            p.kill()
+            p.communicate()
+            logger.error(f"{' '.join(args[0])} timed out after {timeout}s") if log else None
+            return _resp_dict(stderr=f"Timed out after {timeout}s") if as_dict else False
 
         success = p.returncode == 0
 
@@ -2,13 +2,19 @@
 
 pip install .
 
+# static assets
+pi3ctrl-assets
+ln -sfn "$(pi3ctrl-assets --static-folder)" /opt/py3/share/pi3ctrl/static
+
 # reset systemd
 sudo systemctl daemon-reload
 sudo systemctl reset-failed
 
 # restart pi3ctrl services
+sudo systemctl restart pi3ctrl-init.service
 sudo systemctl restart pi3ctrl-core.service
 sudo systemctl restart pi3ctrl-http.service
+sudo systemctl reload nginx
 sudo systemctl start pi3ctrl-wifi.service
 
 # done